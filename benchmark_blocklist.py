@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark da blocklist de veículos
+
+Compara o matcher compilado (vehicle_blocklist.BlocklistMatcher) com a versão
+antiga que estava copiada em parse_prices e normalize_and_sort (set
+reconstruído em cada chamada e um re.search por padrão e por carro), sobre os
+nomes de uma página de resultados real (~300 carros). Confirma que as duas
+dão exatamente as mesmas respostas.
+
+Uso: python benchmark_blocklist.py [ficheiro.html] [--runs N]
+(por omissão usa carjet_test.html)
+"""
+
+import contextlib
+import io
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from vehicle_blocklist import DEFAULT_MODELS, DEFAULT_PATTERNS, BlocklistMatcher
+
+BASE_URL = "https://www.carjet.com/do/list/pt"
+
+
+def legacy_blocked_factory():
+    """Réplica da implementação antiga: tudo reconstruído por chamada de normalize_and_sort"""
+    def _norm_text(s: str) -> str:
+        s = (s or "").strip().lower()
+        return " ".join(s.replace(",", " ").split())
+    _blocked_norm = set(_norm_text(x) for x in DEFAULT_MODELS)
+    import re as _re
+    _patterns = list(DEFAULT_PATTERNS)
+
+    def _blocked(name: str) -> bool:
+        n = _norm_text(name)
+        if not n:
+            return False
+        if n in _blocked_norm:
+            return True
+        for p in _patterns:
+            if _re.search(p, n):
+                return True
+        for b in _blocked_norm:
+            if len(b) >= 6 and b in n:
+                return True
+        return False
+    return _blocked
+
+
+def load_names(path: str):
+    import main
+    html = Path(path).read_text(encoding="utf-8", errors="ignore")
+    with contextlib.redirect_stdout(io.StringIO()):
+        items = main.parse_prices(html, BASE_URL)
+    return [it.get("car", "") for it in items]
+
+
+def bench(fn, runs: int):
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times), min(times)
+
+
+def main_cli(argv):
+    runs = 200
+    files = []
+    it = iter(argv)
+    for a in it:
+        if a == "--runs":
+            runs = int(next(it))
+        else:
+            files.append(a)
+    path = files[0] if files else str(Path(__file__).resolve().parent / "carjet_test.html")
+    names = load_names(path)
+    if not names:
+        print("no cars parsed from", path)
+        return 1
+
+    matcher = BlocklistMatcher()
+    legacy = legacy_blocked_factory()
+    same = [legacy(n) for n in names] == [matcher.is_blocked(n) for n in names]
+
+    def run_legacy():
+        # A versão antiga reconstruía o set/lista em cada chamada (por página)
+        f = legacy_blocked_factory()
+        for n in names:
+            f(n)
+
+    def run_matcher():
+        for n in names:
+            matcher.is_blocked(n)
+
+    med_old, min_old = bench(run_legacy, runs)
+    med_new, min_new = bench(run_matcher, runs)
+    blocked = sum(1 for n in names if matcher.is_blocked(n))
+    print(f"{Path(path).name}: {len(names)} cars, {blocked} blocked, {runs} runs")
+    print(f"  legacy   median={med_old:7.3f} ms  min={min_old:7.3f} ms  ({med_old * 1000 / len(names):6.2f} us/car)")
+    print(f"  matcher  median={med_new:7.3f} ms  min={min_new:7.3f} ms  ({med_new * 1000 / len(names):6.2f} us/car)")
+    if med_new:
+        print(f"  speedup: {med_old / med_new:.1f}x  {'SAME' if same else 'DIFFERENT'}")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli(sys.argv[1:]))
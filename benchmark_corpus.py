@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Corpus de páginas do parser: benchmark e regressão contra outputs golden
+
+Corre parse_prices, parse_carjet_html_complete (carjet_direct) e
+normalize_and_sort sobre as páginas listadas em parser_corpus/manifest.json
+(capturas reais: carjet_test.html, save_carjet_html.html, faro_response.json e
+capturas pw-url-capture-* do Playwright importadas com --add-captures; e páginas
+derivadas de carjet_test.html com --derive, para os caminhos que nenhuma
+captura real percorre: preços só em libras, fallback de preços soltos,
+ofertas embutidas em dataMap, com e sem modelo/foto). Para
+cada página e etapa mostra a mediana em ms, páginas/s e o pico de memória
+(tracemalloc, numa volta à parte), e compara o resultado com o ficheiro golden
+em parser_corpus/golden/. Sai com código 1 se algum resultado mudou, por isso
+serve para provar que uma otimização do parser não altera os carros extraídos.
+
+Corre com uma BD nova (DATA_DIR temporário) e a taxa GBP->EUR fixa, para os
+resultados não dependerem do ambiente.
+
+Uso:
+  python benchmark_corpus.py [--runs N] [--engine soup|lxml] [--only NOME]
+  python benchmark_corpus.py --update-golden      (regrava os golden; rever o diff no git)
+  python benchmark_corpus.py --add-captures [DIR] (importa pw-url-capture-*.html do DEBUG_DIR)
+  python benchmark_corpus.py --derive         (regera as páginas derivadas; depois --update-golden)
+"""
+
+import contextlib
+import hashlib
+import io
+import json
+import os
+import re
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parent
+CORPUS_DIR = ROOT / "parser_corpus"
+MANIFEST = CORPUS_DIR / "manifest.json"
+GOLDEN_DIR = CORPUS_DIR / "golden"
+PAGES_DIR = CORPUS_DIR / "pages"
+DEFAULT_BASE_URL = "https://www.carjet.com/do/list/pt"
+FIXED_GBP_EUR = 1.16
+
+
+def file_sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def load_manifest() -> Dict[str, Any]:
+    return json.loads(MANIFEST.read_text(encoding="utf-8"))
+
+
+def save_manifest(manifest: Dict[str, Any]) -> None:
+    MANIFEST.write_text(json.dumps(manifest, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+
+
+def add_captures(src_dir: Path) -> int:
+    manifest = load_manifest()
+    known = {p["file"] for p in manifest["pages"]}
+    PAGES_DIR.mkdir(parents=True, exist_ok=True)
+    added = 0
+    for src in sorted(src_dir.glob("pw-url-capture-*.html")):
+        dest = PAGES_DIR / src.name
+        rel = str(dest.relative_to(ROOT))
+        if rel in known:
+            continue
+        shutil.copyfile(src, dest)
+        manifest["pages"].append({
+            "name": src.stem,
+            "file": rel,
+            "kind": "html",
+            "base_url": DEFAULT_BASE_URL,
+            "sha256": file_sha256(dest),
+        })
+        added += 1
+        print(f"  added {rel}")
+    if added:
+        manifest["version"] = int(manifest.get("version", 1)) + 1
+        save_manifest(manifest)
+    print(f"{added} capture(s) added; run --update-golden to record their outputs")
+    return 0
+
+
+# --- Páginas derivadas de carjet_test.html ---
+# Um cartão em cada DERIVE_EVERY (variedade de categorias sem 1.8 MB por página); o
+# cabeçalho (rádio frmTrans) e o rodapé da captura ficam iguais.
+DERIVE_SOURCE = "carjet_test.html"
+DERIVE_EVERY = 12
+ARTICLE_RX = re.compile(r"<article\b.*?</article>", re.S)
+EURO_SPAN_RX = re.compile(r'<span class="price (?:old-price old-price-)?(?:pr-)?euros">.*?</span>|<em class="price-day-euros">.*?</em>', re.S)
+PR_EUROS_RX = re.compile(r'(<span class="price pr-euros">)\s*([\d.,]+)\s*€\s*(</span>)')
+CARD_PRV_RX = re.compile(r'data-prv="([^"]+)"')
+CARD_IMG_RX = re.compile(r"/car_([A-Z0-9]+)\.jpg")
+CARD_NAME_RX = re.compile(r'<h2 title="([^"]+)"')
+CARD_PHOTO_RX = re.compile(r'"(/cdn/img/cars/[A-Z]/car_[A-Z0-9]+\.jpg)"')
+
+
+def _split_cards(html: str):
+    first = html.index("<article")
+    last = html.rindex("</article>") + len("</article>")
+    cards = ARTICLE_RX.findall(html[first:last])
+    return html[:first], cards[::DERIVE_EVERY], html[last:]
+
+
+def _derive_gbp(html: str) -> str:
+    """Cartões só com os preços em libras (pr-libras), como o site mostra em GBP"""
+    head, cards, tail = _split_cards(html)
+    return head + "\n".join(EURO_SPAN_RX.sub("", c) for c in cards) + tail
+
+
+def _derive_loose(html: str) -> str:
+    """Sem marcação de cartão (<article> -> <div>) e o total em "€ 12,34": fallback de preços soltos"""
+    head, cards, tail = _split_cards(html)
+    out = []
+    for c in cards:
+        c = c.replace("<article", '<div data-card="offer"', 1)[: -len("</article>")] + "</div>"
+        out.append(PR_EUROS_RX.sub(lambda m: f"{m.group(1)}€ {m.group(2)}{m.group(3)}", c))
+    return head + "\n".join(out) + tail
+
+
+def _derive_offers(html: str) -> str:
+    """Lista ainda por desenhar: só as ofertas em var dataMap (fornecedor, preço, grupoVeh)"""
+    head, cards, tail = _split_cards(html)
+    offers = []
+    for c in cards:
+        prv = CARD_PRV_RX.search(c)
+        img = CARD_IMG_RX.search(c)
+        price = PR_EUROS_RX.search(c)
+        if prv and img and price:
+            offers.append({"id": prv.group(1), "priceStr": f"{price.group(2)} €", "grupoVeh": img.group(1)})
+    script = "<script>var dataMap = " + json.dumps(offers, ensure_ascii=False) + ";</script>"
+    return head + script + tail
+
+
+def _derive_offers_named(html: str) -> str:
+    """Ofertas em var dataMap que também trazem o modelo e a foto: servidas sem construir o DOM"""
+    head, cards, tail = _split_cards(html)
+    offers = []
+    for c in cards:
+        prv = CARD_PRV_RX.search(c)
+        img = CARD_IMG_RX.search(c)
+        price = PR_EUROS_RX.search(c)
+        name = CARD_NAME_RX.search(c)
+        photo = CARD_PHOTO_RX.search(c)
+        if prv and img and price and name and photo:
+            offers.append({"id": prv.group(1), "priceStr": f"{price.group(2)} €", "grupoVeh": img.group(1),
+                           "modelo": name.group(1), "img": photo.group(1)})
+    script = "<script>var dataMap = " + json.dumps(offers, ensure_ascii=False) + ";</script>"
+    return head + script + tail
+
+
+DERIVED = {
+    "carjet_gbp": (_derive_gbp, "cards keep only the pr-libras (GBP) prices"),
+    "carjet_loose": (_derive_loose, "cards as plain divs, total price written as '€ 12,34'"),
+    "carjet_offers": (_derive_offers, "cards replaced by var dataMap offers built from them"),
+    "carjet_offers_named": (_derive_offers_named, "dataMap offers that also carry model name and photo (JSON tier)"),
+}
+
+
+def derive_pages() -> int:
+    manifest = load_manifest()
+    by_name = {p["name"]: p for p in manifest["pages"]}
+    source = (ROOT / DERIVE_SOURCE).read_text(encoding="utf-8", errors="ignore")
+    PAGES_DIR.mkdir(parents=True, exist_ok=True)
+    for name, (fn, note) in DERIVED.items():
+        dest = PAGES_DIR / f"{name}.html"
+        dest.write_text(fn(source), encoding="utf-8")
+        entry = by_name.get(name)
+        if entry is None:
+            entry = {"name": name}
+            manifest["pages"].append(entry)
+        entry.update({
+            "file": str(dest.relative_to(ROOT)),
+            "kind": "html",
+            "base_url": DEFAULT_BASE_URL,
+            "derived_from": DERIVE_SOURCE,
+            "derivation": note,
+            "sha256": file_sha256(dest),
+        })
+        print(f"  {entry['file']}: {dest.stat().st_size // 1024} KB ({note})")
+    manifest["version"] = int(manifest.get("version", 1)) + 1
+    save_manifest(manifest)
+    print(f"{len(DERIVED)} derived page(s) written; run --update-golden to record their outputs")
+    return 0
+
+
+def stages_for(page: Dict[str, Any], main, carjet_direct) -> List[tuple]:
+    """[(nome, função sem argumentos)]: cada etapa recebe o output da anterior quando precisa"""
+    path = ROOT / page["file"]
+    base_url = page.get("base_url") or DEFAULT_BASE_URL
+    if page.get("kind") == "json":
+        data = json.loads(path.read_text(encoding="utf-8"))
+        items = data.get("items") or []
+        return [("normalize_and_sort", lambda: main.normalize_and_sort([dict(it) for it in items], None))]
+    html = path.read_text(encoding="utf-8", errors="ignore")
+    state: Dict[str, Any] = {}
+
+    def _parse():
+        state["items"] = main._parse_prices_tiers(html, base_url)
+        return state["items"]
+    return [
+        ("parse_prices", _parse),
+        ("parse_carjet_html_complete", lambda: carjet_direct.parse_carjet_html_complete(html)),
+        ("normalize_and_sort", lambda: main.normalize_and_sort([dict(it) for it in state["items"]], None)),
+    ]
+
+
+def quiet(fn: Callable[[], Any]) -> Any:
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        return fn()
+
+
+def first_diff(old: List[Any], new: List[Any]) -> str:
+    if len(old) != len(new):
+        return f"{len(old)} -> {len(new)} items"
+    for i, (a, b) in enumerate(zip(old, new)):
+        if a != b:
+            if isinstance(a, dict) and isinstance(b, dict):
+                keys = sorted(k for k in set(a) | set(b) if a.get(k) != b.get(k))
+                return f"item {i}: " + ", ".join(f"{k}: {a.get(k)!r} -> {b.get(k)!r}" for k in keys[:4])
+            return f"item {i}: {a!r} -> {b!r}"
+    return "same"
+
+
+def main_cli(argv):
+    runs = 3
+    engine = None
+    only = None
+    update = False
+    it = iter(argv)
+    for a in it:
+        if a == "--runs":
+            runs = int(next(it))
+        elif a == "--engine":
+            engine = next(it)
+        elif a == "--only":
+            only = next(it)
+        elif a == "--update-golden":
+            update = True
+        elif a == "--add-captures":
+            nxt = next(it, None)
+            src = Path(nxt) if nxt else Path(os.environ.get("DEBUG_DIR", ROOT / "static" / "debug"))
+            return add_captures(src)
+        elif a == "--derive":
+            return derive_pages()
+
+    # BD descartável: os golden não dependem de veículos/overrides/fotos guardados localmente
+    data_dir = tempfile.mkdtemp(prefix="parser-corpus-")
+    os.environ["DATA_DIR"] = data_dir
+    sys.path.insert(0, str(ROOT))
+    import carjet_direct
+    import main
+    from parse_cache import ParseCache
+    main._photo_db_path = lambda: str(Path(data_dir) / "car_images.db")
+    main._PARSE_CACHE = ParseCache(0)
+    main._FX.set_table({"GBP->EUR": FIXED_GBP_EUR})
+    if engine:
+        main.PARSER_ENGINE = engine
+
+    manifest = load_manifest()
+    GOLDEN_DIR.mkdir(parents=True, exist_ok=True)
+    print(f"corpus v{manifest.get('version')}: {len(manifest['pages'])} pages, engine={main.PARSER_ENGINE}, runs={runs}")
+    failed = 0
+    totals: Dict[str, List[float]] = {}
+    for page in manifest["pages"]:
+        if only and only != page["name"]:
+            continue
+        path = ROOT / page["file"]
+        if not path.exists():
+            print(f"\n{page['name']}: MISSING {page['file']}")
+            failed += 1
+            continue
+        changed = file_sha256(path) != page.get("sha256")
+        golden_path = GOLDEN_DIR / f"{page['name']}.json"
+        golden = json.loads(golden_path.read_text(encoding="utf-8")) if golden_path.exists() else None
+        size_kb = path.stat().st_size // 1024
+        print(f"\n{page['name']} ({size_kb} KB){'  [page changed since manifest]' if changed and not update else ''}")
+        outputs: Dict[str, Any] = {}
+        for name, fn in stages_for(page, main, carjet_direct):
+            times = []
+            out = None
+            for _ in range(max(1, runs)):
+                t0 = time.perf_counter()
+                out = quiet(fn)
+                times.append((time.perf_counter() - t0) * 1000)
+            tracemalloc.start()
+            quiet(fn)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            med = statistics.median(times)
+            totals.setdefault(name, []).append(med)
+            outputs[name] = out
+            status = ""
+            if golden is not None and not update:
+                if name not in golden:
+                    status = "NO GOLDEN"
+                elif golden[name] == out:
+                    status = "OK"
+                else:
+                    status = f"DIFF ({first_diff(golden[name], out)})"
+                    failed += 1
+            print(f"  {name:27s} items={len(out):4d}  median={med:8.1f} ms  pages/s={1000 / med if med else 0:7.1f}  "
+                  f"peak={peak / 1048576:6.1f} MB  {status}")
+        if golden is None and not update:
+            print("  no golden output (run --update-golden)")
+            failed += 1
+        if update:
+            golden_path.write_text(json.dumps(outputs, indent=1, ensure_ascii=False, sort_keys=True) + "\n", encoding="utf-8")
+            page["sha256"] = file_sha256(path)
+            print(f"  golden written: {golden_path.relative_to(ROOT)}")
+    if update:
+        save_manifest(manifest)
+    print("\nper stage (sum of medians over the corpus):")
+    for name, meds in totals.items():
+        total = sum(meds)
+        print(f"  {name:27s} {total:8.1f} ms  {len(meds) * 1000 / total if total else 0:7.1f} pages/s")
+    print(f"max RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+    if not update:
+        print("golden: " + ("OK" if not failed else f"{failed} FAILED"))
+    return 0 if update or not failed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli(sys.argv[1:]))
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark do parse em threads vs pool de processos (PARSE_WORKERS)
+
+Simula um bulk-prices de várias localizações: N páginas analisadas com a mesma
+concorrência do bulk (BULK_CONCURRENCY), primeiro com asyncio.to_thread (o
+caminho antigo, limitado pelo GIL) e depois com o ParsePool de 1 até
+os.cpu_count() workers (aquecidos antes da medição). Mostra páginas/s e o
+ganho face às threads, e confirma que os itens são idênticos. Num servidor com
+um só core não há ganho a medir, só o custo de enviar as páginas aos workers.
+
+Uso: python benchmark_parse_pool.py [ficheiro.html] [--pages N] [--workers 1,2,4]
+(por omissão usa carjet_test.html, 12 páginas)
+"""
+
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+from pathlib import Path
+
+BASE_URL = "https://www.carjet.com/do/list/pt"
+
+
+async def run_batch(run, pages, concurrency: int):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(html: str):
+        async with sem:
+            return await run(html, BASE_URL)
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*(one(h) for h in pages))
+    return time.perf_counter() - t0, [r[0] for r in results]
+
+
+def main_cli(argv):
+    import main
+    from parse_pool import ParsePool
+
+    n_pages = 12
+    workers_list = None
+    files = []
+    it = iter(argv)
+    for a in it:
+        if a == "--pages":
+            n_pages = int(next(it))
+        elif a == "--workers":
+            workers_list = [int(x) for x in next(it).split(",") if x.strip()]
+        else:
+            files.append(a)
+    path = files[0] if files else str(Path(__file__).resolve().parent / "carjet_test.html")
+    html = Path(path).read_text(encoding="utf-8", errors="ignore")
+    # Páginas diferentes (um comentário no fim) para o resultado não depender de caches
+    pages = [html + f"<!-- page {i} -->" for i in range(n_pages)]
+    cpus = os.cpu_count() or 1
+    workers_list = workers_list or sorted(set([1, 2, cpus] + ([cpus // 2] if cpus >= 4 else [])))
+    concurrency = main.BULK_CONCURRENCY
+
+    async def threads(h, u):
+        return await asyncio.to_thread(main._parse_worker_run, h, u)
+
+    print(f"{Path(path).name}: {n_pages} pages, concurrency={concurrency}, cpu_count={cpus}, engine={main.PARSER_ENGINE}")
+    with contextlib.redirect_stdout(io.StringIO()):
+        t_thr, ref = asyncio.run(run_batch(threads, pages, concurrency))
+    print(f"  threads      {t_thr * 1000:8.0f} ms  {n_pages / t_thr:6.2f} pages/s")
+    ok = True
+    for w in workers_list:
+        pool = ParsePool(w, main._parse_worker_run, main._parse_worker_init, main._parse_worker_config)
+        pool.warm()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                t_pool, got = asyncio.run(run_batch(pool.run, pages, concurrency))
+        finally:
+            pool.shutdown()
+        same = got == ref
+        ok = ok and same
+        st = pool.stats()
+        print(f"  workers={w:<3d} {t_pool * 1000:8.0f} ms  {n_pages / t_pool:6.2f} pages/s  "
+              f"speedup={t_thr / t_pool:4.2f}x  warm={st['warm_ms']} ms  fallbacks={st['fallbacks']}  "
+              f"{'SAME' if same else 'DIFFERENT'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli(sys.argv[1:]))
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark lado a lado dos engines de parse_prices (soup vs lxml)
+
+Corre os dois engines sobre as mesmas páginas guardadas, confirma que devolvem
+exatamente os mesmos items e mostra o tempo por página (e o de um hit na cache
+de parse).
+
+Uso: python benchmark_parsers.py [ficheiro.html ...] [--runs N]
+(por omissão usa carjet_test.html)
+"""
+
+import contextlib
+import io
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import main
+
+BASE_URL = "https://www.carjet.com/do/list/pt"
+ENGINES = ("soup", "lxml")
+
+
+def run_engine(engine: str, html: str, runs: int):
+    main.PARSER_ENGINE = engine
+    times = []
+    items = []
+    for _ in range(runs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            items = main._parse_prices_tiers(html, BASE_URL)
+            times.append((time.perf_counter() - t0) * 1000)
+    return items, times
+
+
+def main_cli(argv):
+    runs = 5
+    files = []
+    it = iter(argv)
+    for a in it:
+        if a == "--runs":
+            runs = int(next(it))
+        else:
+            files.append(a)
+    if not files:
+        files = [str(Path(__file__).resolve().parent / "carjet_test.html")]
+
+    ok = True
+    for f in files:
+        html = Path(f).read_text(encoding="utf-8", errors="ignore")
+        # Uma volta de aquecimento (cache de fotos, regex compiladas)
+        run_engine("soup", html, 1)
+        results = {e: run_engine(e, html, runs) for e in ENGINES}
+        base_items = results["soup"][0]
+        print(f"\n{Path(f).name} ({len(html) // 1024} KB, {runs} runs)")
+        for engine in ENGINES:
+            items, times = results[engine]
+            med = statistics.median(times)
+            same = items == base_items
+            ok = ok and same
+            print(f"  {engine:5s} items={len(items):4d}  median={med:8.1f} ms  min={min(times):8.1f} ms  "
+                  f"pages/s={1000 / med if med else 0:6.1f}  {'SAME' if same else 'DIFFERENT'}")
+        soup_med = statistics.median(results["soup"][1])
+        lxml_med = statistics.median(results["lxml"][1])
+        if lxml_med:
+            print(f"  speedup lxml vs soup: {soup_med / lxml_med:.1f}x")
+        # Mesma página outra vez através do parse_prices: servida pela cache por hash do HTML
+        main._invalidate_parse_cache()
+        with contextlib.redirect_stdout(io.StringIO()):
+            main.parse_prices(html, BASE_URL)
+            t0 = time.perf_counter()
+            cached = main.parse_prices(html, BASE_URL)
+            hit_ms = (time.perf_counter() - t0) * 1000
+        same = cached == base_items
+        ok = ok and same
+        print(f"  cache hit: {hit_ms:.1f} ms  {'SAME' if same else 'DIFFERENT'}  {main._PARSE_CACHE.stats()}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli(sys.argv[1:]))
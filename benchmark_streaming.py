@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark do parse em streaming (PARSE_STREAMING)
+
+Simula o download de uma página de resultados a uma dada velocidade (blocos de
+64 KB com pausas) e compara o caminho em lote (esperar pela página inteira,
+parse_prices + normalize_and_sort) com o _PriceStream (cartões processados à
+medida que chegam, nomes normalizados durante o download). Mostra o tempo até
+ao primeiro item, o tempo total e confirma que o resultado final é idêntico.
+
+Uso: python benchmark_streaming.py [ficheiro.html] [--kbps N] [--engine soup|lxml]
+(por omissão usa carjet_test.html a 2000 KB/s e o engine lxml)
+"""
+
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+import main
+from parse_cache import ParseCache
+
+BASE_URL = "https://www.carjet.com/do/list/pt"
+
+
+def chunks(html: str, size: int):
+    for i in range(0, len(html), size):
+        yield html[i:i + size]
+
+
+def run_batch(html: str, delay: float):
+    t0 = time.perf_counter()
+    for _ in chunks(html, main._STREAM_CHUNK_CHARS):
+        time.sleep(delay)
+    t_dl = time.perf_counter() - t0
+    items = main.parse_prices(html, BASE_URL)
+    t_first = time.perf_counter() - t0
+    rows = main.normalize_and_sort(items, None)
+    return items, rows, t_dl, t_first, time.perf_counter() - t0
+
+
+def run_stream(html: str, delay: float):
+    t0 = time.perf_counter()
+    stream = main._PriceStream(BASE_URL, on_items=main._warm_name_pipeline)
+    t_first = None
+    for chunk in chunks(html, main._STREAM_CHUNK_CHARS):
+        time.sleep(delay)
+        if stream.feed(chunk) and t_first is None:
+            t_first = time.perf_counter() - t0
+    t_dl = time.perf_counter() - t0
+    items = stream.close()
+    if t_first is None:
+        t_first = time.perf_counter() - t0
+    rows = main.normalize_and_sort(items, None)
+    return items, rows, t_dl, t_first, time.perf_counter() - t0
+
+
+def main_cli(argv):
+    kbps = 2000.0
+    engine = "lxml"
+    files = []
+    it = iter(argv)
+    for a in it:
+        if a == "--kbps":
+            kbps = float(next(it))
+        elif a == "--engine":
+            engine = next(it)
+        else:
+            files.append(a)
+    path = files[0] if files else str(Path(__file__).resolve().parent / "carjet_test.html")
+    html = Path(path).read_text(encoding="utf-8", errors="ignore")
+    main.PARSER_ENGINE = engine
+    # Sem cache de resultados: os dois caminhos fazem o parse completo
+    main._PARSE_CACHE = ParseCache(0)
+    delay = main._STREAM_CHUNK_CHARS / 1024.0 / kbps
+
+    results = {}
+    for name, fn in (("batch", run_batch), ("stream", run_stream)):
+        main._NAME_PIPELINE.invalidate("benchmark")
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            results[name] = fn(html, delay)
+    print(f"{Path(path).name}: {len(html) // 1024} KB at {kbps:.0f} KB/s, engine={engine}")
+    for name, (items, rows, t_dl, t_first, t_total) in results.items():
+        print(f"  {name:6s} download={t_dl * 1000:7.1f} ms  first item={t_first * 1000:7.1f} ms  "
+              f"total={t_total * 1000:7.1f} ms  items={len(items)}")
+    same = results["batch"][0] == results["stream"][0] and results["batch"][1] == results["stream"][1]
+    t_b, t_s = results["batch"][4], results["stream"][4]
+    print(f"  end-to-end: {t_b / t_s:.2f}x  {'SAME' if same else 'DIFFERENT'}")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli(sys.argv[1:]))
@@ -0,0 +1,195 @@
+"""
+Cache LRU em memória limitada por entradas, bytes e TTL
+
+Os caches de respostas (/api/prices por URL, /api/track-by-url por URL
+normalizado) guardam listas completas de items com fotos e links; como dicts
+simples nunca largavam nada e o RSS do worker crescia até o Render o
+reiniciar. Aqui cada entrada tem o tamanho estimado (JSON serializado) e um
+TTL próprio; ao passar o limite de entradas ou de bytes sai a menos usada
+recentemente. Conta hits, misses, expirações e evicções para o admin.
+
+Opcionalmente tem um segundo nível (backing, p.ex. PersistentCache) atrás da
+memória: os sets também vão para lá, os misses em memória procuram lá e a
+entrada encontrada volta para a memória com o timestamp original; warm()
+carrega as entradas mais recentes no arranque. A leitura do backing é
+bloqueante: código async usa peek_entry() (só memória) e chama load() numa
+thread quando falha.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+def json_size(value: Any) -> int:
+    """Tamanho aproximado de um payload: bytes do JSON (UTF-8 conta como 1 por carácter)"""
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str, separators=(",", ":")))
+    except Exception:
+        return 0
+
+
+class _Entry:
+    __slots__ = ("value", "ts", "expires", "size")
+
+    def __init__(self, value: Any, ts: float, expires: float, size: int):
+        self.value = value
+        self.ts = ts
+        self.expires = expires
+        self.size = size
+
+
+class BoundedCache:
+    def __init__(self, name: str, max_entries: int = 500, max_bytes: int = 64 * 1024 * 1024,
+                 ttl: float = 300.0, sizeof: Callable[[Any], int] = json_size, backing: Any = None):
+        self.name = name
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(1, int(max_bytes))
+        self.ttl = float(ttl)
+        self._sizeof = sizeof
+        self.backing = backing
+        self._data: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.rejected = 0
+        self.sets = 0
+        self.backing_hits = 0
+        self.warmed = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get_entry(key, count=False) is not None
+
+    def _drop(self, key: Hashable) -> Optional[_Entry]:
+        e = self._data.pop(key, None)
+        if e is not None:
+            self.bytes -= e.size
+        return e
+
+    def get_entry(self, key: Hashable, count: bool = True) -> Optional[Tuple[float, Any]]:
+        """(timestamp, valor) se a entrada existe e não expirou (em memória ou no backing)"""
+        hit = self.peek_entry(key, count)
+        if hit is not None:
+            return hit
+        if not count:
+            return None
+        return self.load(key)
+
+    def peek_entry(self, key: Hashable, count: bool = True) -> Optional[Tuple[float, Any]]:
+        """Como get_entry mas só em memória (não bloqueia); um miss aqui não é contado"""
+        now = time.time()
+        with self._lock:
+            e = self._data.get(key)
+            if e is not None and e.expires <= now:
+                self._drop(key)
+                self.expirations += 1
+                e = None
+            if e is None:
+                return None
+            self._data.move_to_end(key)
+            if count:
+                self.hits += 1
+            return e.ts, e.value
+
+    def load(self, key: Hashable) -> Optional[Tuple[float, Any]]:
+        """Procura no backing (bloqueante) e guarda em memória o que encontrar; conta o hit/miss"""
+        hit = self.backing.get(key) if self.backing is not None else None
+        if hit is None:
+            self.misses += 1
+            return None
+        ts, expires, value = hit
+        self._store(key, value, ts, expires)
+        self.hits += 1
+        self.backing_hits += 1
+        return ts, value
+
+    def _store(self, key: Hashable, value: Any, ts: float, expires: float) -> bool:
+        size = self._sizeof(value)
+        with self._lock:
+            self._drop(key)
+            if size > self.max_bytes:
+                self.rejected += 1
+                return False
+            self._data[key] = _Entry(value, ts, expires, size)
+            self.bytes += size
+            while len(self._data) > self.max_entries or self.bytes > self.max_bytes:
+                old_key = next(iter(self._data))
+                self._drop(old_key)
+                self.evictions += 1
+        return True
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        hit = self.get_entry(key)
+        return hit[1] if hit is not None else default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, ts: Optional[float] = None) -> bool:
+        """Guarda (substitui) a entrada; False se sozinha já passa o orçamento de bytes"""
+        now = time.time() if ts is None else ts
+        expires = now + (self.ttl if ttl is None else float(ttl))
+        self.sets += 1
+        if self.backing is not None:
+            self.backing.put(key, value, now, expires)
+        return self._store(key, value, now, expires)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            e = self._drop(key)
+        if self.backing is not None:
+            self.backing.delete(key)
+        return e.value if e is not None else default
+
+    def warm(self, limit: int) -> int:
+        """Carrega do backing as `limit` entradas mais recentes ainda válidas"""
+        if self.backing is None:
+            return 0
+        n = 0
+        for key, ts, expires, value in self.backing.recent(min(int(limit), self.max_entries)):
+            if self._store(key, value, ts, expires):
+                n += 1
+        self.warmed += n
+        return n
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            dead = [k for k, e in self._data.items() if e.expires <= now]
+            for k in dead:
+                self._drop(k)
+            self.expirations += len(dead)
+        return len(dead)
+
+    def clear(self) -> int:
+        with self._lock:
+            n = len(self._data)
+            self._data.clear()
+            self.bytes = 0
+        return n
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "sets": self.sets,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "rejected": self.rejected,
+            "backing_hits": self.backing_hits,
+            "warmed": self.warmed,
+            "backing": self.backing.stats() if self.backing is not None else None,
+        }
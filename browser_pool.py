@@ -0,0 +1,474 @@
+"""
+Pool de browsers Playwright "quentes" para o CarJet
+
+Em vez de lançar um Chromium novo por pesquisa, mantemos um browser por motor
+(chromium/webkit) e um conjunto de contexts já preparados: cookies EUR/PT
+definidos, homepage visitada e consentimento de cookies aceite. Cada pesquisa
+aluga um context (lease), abre as suas páginas e devolve-o. Contexts com erro
+ou com mais de N usos são reciclados; o browser é relançado após M contexts
+ou se deixar de estar ligado. Ao devolver um context limpam-se as cookies
+(sessão CarJet, filtros aplicados na UI como #chkAUP) e repõem-se as
+CARJET_COOKIES e as de consentimento, para a pesquisa seguinte começar limpa.
+
+Cada context leva um filtro de pedidos (RequestFilter) que aborta imagens,
+fontes, media e hosts third-party (ads/analytics); ResultCapture junta as
+respostas carList.asp/modalFilter.asp/do/list e sinaliza assim que a lista
+chega completa, para não ficar à espera de networkidle.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+try:
+    from playwright.async_api import async_playwright  # type: ignore
+    _HAS_ASYNC_PLAYWRIGHT = True
+except Exception:
+    _HAS_ASYNC_PLAYWRIGHT = False
+
+CARJET_COOKIES = [
+    {"name": "monedaForzada", "value": "EUR", "domain": ".carjet.com", "path": "/"},
+    {"name": "moneda", "value": "EUR", "domain": ".carjet.com", "path": "/"},
+    {"name": "currency", "value": "EUR", "domain": ".carjet.com", "path": "/"},
+    {"name": "country", "value": "PT", "domain": ".carjet.com", "path": "/"},
+    {"name": "idioma", "value": "PT", "domain": ".carjet.com", "path": "/"},
+    {"name": "lang", "value": "pt", "domain": ".carjet.com", "path": "/"},
+]
+
+# Cookies de consentimento (didomi) que sobrevivem ao reset da sessão entre leases
+CONSENT_COOKIE_PREFIXES = ("didomi", "euconsent")
+
+CONSENT_SELECTORS = [
+    "#didomi-notice-agree-button",
+    ".didomi-continue-without-agreeing",
+    "button:has-text('Aceitar')",
+    "button:has-text('I agree')",
+    "button:has-text('Accept')",
+]
+
+# --- Filtro de pedidos ---
+BLOCKED_RESOURCE_TYPES = ("image", "media", "font")
+FIRST_PARTY_SUFFIXES = ("carjet.com",)
+# CDNs de scripts de que os formulários do CarJet dependem (jQuery/datepicker)
+DEFAULT_ALLOWED_HOSTS = ("ajax.googleapis.com", "code.jquery.com", "cdnjs.cloudflare.com", "cdn.jsdelivr.net")
+# Pedidos abortados não têm resposta: estimativa de tamanho médio por tipo (bytes)
+RESOURCE_SIZE_ESTIMATE = {
+    "image": 30000, "media": 250000, "font": 45000, "script": 40000,
+    "stylesheet": 20000, "xhr": 3000, "fetch": 3000, "document": 30000,
+}
+DEFAULT_SIZE_ESTIMATE = 8000
+
+# Pedidos que chegam aos servidores aplicacionais (contam para o rate limit do host)
+THROTTLED_RESOURCE_TYPES = ("document", "xhr", "fetch")
+
+RESULT_URL_MARKERS = ("modalFilter.asp", "carList.asp", "/do/list/pt", "filtroUso.asp")
+
+WARM_URL = "https://www.carjet.com/aluguel-carros/index.htm"
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/26.0.1 Safari/605.1.15"
+
+
+def _host_matches(host: str, suffixes: Iterable[str]) -> bool:
+    return any(host == s or host.endswith("." + s) for s in suffixes)
+
+
+class RequestFilter:
+    """Route handler: aborta recursos não essenciais e hosts third-party, contando o que poupou"""
+
+    def __init__(self, blocked_types: Iterable[str] = BLOCKED_RESOURCE_TYPES,
+                 first_party: Iterable[str] = FIRST_PARTY_SUFFIXES,
+                 allowed_hosts: Iterable[str] = DEFAULT_ALLOWED_HOSTS,
+                 throttle: Optional[Callable[[str], Awaitable[None]]] = None):
+        self.blocked_types = frozenset(blocked_types)
+        self.throttle = throttle
+        self.first_party = tuple(first_party)
+        self.allowed_hosts = tuple(h.strip().lower() for h in allowed_hosts if h and h.strip())
+        self.reset()
+
+    def reset(self) -> Dict[str, int]:
+        """Zera os contadores (início de cada pesquisa) e devolve os anteriores"""
+        prev = getattr(self, "counters", None) or {}
+        self.counters = {"requests": 0, "blocked": 0, "bytes_saved": 0}
+        return prev
+
+    def should_block(self, url: str, resource_type: str) -> bool:
+        try:
+            pr = urlparse(url)
+        except Exception:
+            return False
+        if pr.scheme not in ("http", "https"):
+            return False
+        host = (pr.hostname or "").lower()
+        if _host_matches(host, self.first_party):
+            return resource_type in self.blocked_types
+        if _host_matches(host, self.allowed_hosts):
+            return resource_type in self.blocked_types
+        # Third-party (ads, analytics, consent SDKs, CDNs de imagens): nunca necessário para a lista
+        return True
+
+    async def handle(self, route: Any) -> None:
+        req = route.request
+        self.counters["requests"] += 1
+        rtype = req.resource_type or ""
+        try:
+            if self.should_block(req.url, rtype):
+                self.counters["blocked"] += 1
+                self.counters["bytes_saved"] += RESOURCE_SIZE_ESTIMATE.get(rtype, DEFAULT_SIZE_ESTIMATE)
+                await route.abort()
+            else:
+                if self.throttle is not None and rtype in THROTTLED_RESOURCE_TYPES:
+                    await self.throttle(req.url)
+                await route.continue_()
+        except Exception:
+            # Página/context já fechado
+            pass
+
+    async def install(self, target: Any) -> None:
+        """Instala o filtro num BrowserContext ou Page"""
+        await target.route("**/*", self.handle)
+
+
+class ResultCapture:
+    """Junta as respostas de resultados do CarJet e sinaliza quando a lista chega completa"""
+
+    def __init__(self, is_complete: Optional[Callable[[str], bool]] = None,
+                 markers: Iterable[str] = RESULT_URL_MARKERS,
+                 on_body: Optional[Callable[[str, str], Any]] = None):
+        self.markers = tuple(markers)
+        self.is_complete = is_complete or (lambda body: "<article" in body or "dataMap" in body)
+        self.on_body = on_body
+        self.bodies: List[Tuple[str, str]] = []
+        self.complete: Optional[Tuple[str, str]] = None
+        self._done = asyncio.Event()
+        self._t0 = time.time()
+        self.resolved_ms: Optional[int] = None
+
+    def attach(self, page: Any) -> "ResultCapture":
+        page.on("response", self._on_response)
+        return self
+
+    def matches(self, url: str) -> bool:
+        return any(k in (url or "") for k in self.markers)
+
+    async def _on_response(self, resp: Any) -> None:
+        try:
+            u = resp.url or ""
+            if not self.matches(u) or resp.status != 200:
+                return
+            body = await resp.text()
+        except Exception:
+            return
+        if not body:
+            return
+        self.bodies.append((u, body))
+        if self.on_body is not None:
+            try:
+                self.on_body(u, body)
+            except Exception:
+                pass
+        if self.complete is None and self.is_complete(body):
+            self.complete = (u, body)
+            self.resolved_ms = int((time.time() - self._t0) * 1000)
+            self._done.set()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    async def wait(self, timeout: float) -> bool:
+        """Espera até a lista completa ser capturada (True) ou esgotar o timeout (False)"""
+        if self._done.is_set():
+            return True
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def best(self) -> Optional[Tuple[str, str]]:
+        """Primeira resposta completa; senão a primeira capturada"""
+        if self.complete is not None:
+            return self.complete
+        return self.bodies[0] if self.bodies else None
+
+
+class PooledContext:
+    """Context alugado: .context é o BrowserContext do Playwright"""
+
+    def __init__(self, engine: str, browser: Any, context: Any):
+        self.engine = engine
+        self.browser = browser
+        self.context = context
+        self.uses = 0
+        self.warm = False
+        self.created_at = time.time()
+        self.filter: Optional[RequestFilter] = None
+
+
+class BrowserPool:
+    def __init__(self, size: int = 2, context_max_uses: int = 20, browser_max_contexts: int = 100,
+                 warm_url: str = WARM_URL, user_agent: str = DEFAULT_USER_AGENT, headless: bool = True,
+                 block_resources: bool = True, allowed_hosts: Iterable[str] = DEFAULT_ALLOWED_HOSTS,
+                 throttle: Optional[Callable[[str], Awaitable[None]]] = None):
+        self.size = max(1, int(size or 1))
+        self.context_max_uses = max(1, int(context_max_uses or 1))
+        self.browser_max_contexts = max(1, int(browser_max_contexts or 1))
+        self.warm_url = warm_url
+        self.user_agent = user_agent
+        self.headless = headless
+        self.block_resources = block_resources
+        self.allowed_hosts = tuple(allowed_hosts)
+        self.throttle = throttle
+        self._pw = None
+        self._pw_lock = asyncio.Lock()
+        self._browsers: Dict[str, Any] = {}
+        self._browser_contexts: Dict[str, int] = {}
+        self._open_per_browser: Dict[int, int] = {}
+        self._retired: List[Any] = []
+        self._idle: Dict[str, List[PooledContext]] = {}
+        self._sems: Dict[str, asyncio.Semaphore] = {}
+        self._launch_lock = asyncio.Lock()
+        self._stats = {
+            "leases": 0, "lease_wait_ms": 0, "contexts_created": 0, "contexts_recycled": 0,
+            "browsers_launched": 0, "warm_failures": 0, "unhealthy": 0, "session_resets": 0,
+            "requests_seen": 0, "requests_blocked": 0, "bytes_saved": 0, "last_bytes_saved": 0,
+        }
+
+    # --- Ciclo de vida ---
+    async def _playwright(self):
+        if not _HAS_ASYNC_PLAYWRIGHT:
+            raise RuntimeError("playwright is not installed")
+        async with self._pw_lock:
+            if self._pw is None:
+                self._pw = await async_playwright().start()
+        return self._pw
+
+    async def warm_up(self, engine: str = "chromium") -> None:
+        """Pré-cria os contexts do pool (chamado no startup, em background)"""
+        sem = self._sem(engine)
+        slots: List[PooledContext] = []
+        try:
+            for _ in range(self.size):
+                await sem.acquire()
+                try:
+                    slot = self._idle.setdefault(engine, []).pop() if self._idle.get(engine) else await self._new_slot(engine)
+                    slots.append(slot)
+                except BaseException:
+                    sem.release()
+                    raise
+        finally:
+            # Mesmo se um launch falhar a meio, os contexts já criados voltam ao pool
+            for slot in slots:
+                self._release(slot, ok=True, count_use=False)
+
+    async def close(self) -> None:
+        for slots in self._idle.values():
+            for slot in slots:
+                try:
+                    await slot.context.close()
+                except Exception:
+                    pass
+        self._idle.clear()
+        for b in list(self._browsers.values()) + self._retired:
+            try:
+                await b.close()
+            except Exception:
+                pass
+        self._browsers.clear()
+        self._retired = []
+        if self._pw is not None:
+            try:
+                await self._pw.stop()
+            except Exception:
+                pass
+            self._pw = None
+
+    # --- Lease ---
+    def _sem(self, engine: str) -> asyncio.Semaphore:
+        sem = self._sems.get(engine)
+        if sem is None:
+            sem = self._sems[engine] = asyncio.Semaphore(self.size)
+        return sem
+
+    @asynccontextmanager
+    async def lease(self, engine: str = "chromium"):
+        t0 = time.time()
+        sem = self._sem(engine)
+        await sem.acquire()
+        slot: Optional[PooledContext] = None
+        try:
+            slot = await self._acquire(engine)
+        except Exception:
+            sem.release()
+            raise
+        self._stats["leases"] += 1
+        self._stats["lease_wait_ms"] += int((time.time() - t0) * 1000)
+        if slot.filter is not None:
+            slot.filter.reset()
+        ok = False
+        try:
+            yield slot
+            ok = True
+        finally:
+            await self._close_pages(slot)
+            self._record_filter(slot)
+            if ok:
+                ok = await self._reset_session(slot)
+            self._release(slot, ok=ok)
+
+    async def _reset_session(self, slot: PooledContext) -> bool:
+        """Limpa a sessão CarJet do context; se falhar o context é reciclado"""
+        try:
+            keep = [c for c in await slot.context.cookies() if str(c.get("name", "")).startswith(CONSENT_COOKIE_PREFIXES)]
+            await slot.context.clear_cookies()
+            await slot.context.add_cookies(CARJET_COOKIES + keep)
+        except Exception:
+            return False
+        self._stats["session_resets"] += 1
+        return True
+
+    def _record_filter(self, slot: PooledContext) -> None:
+        if slot.filter is None:
+            return
+        c = slot.filter.counters
+        self._stats["requests_seen"] += c["requests"]
+        self._stats["requests_blocked"] += c["blocked"]
+        self._stats["bytes_saved"] += c["bytes_saved"]
+        self._stats["last_bytes_saved"] = c["bytes_saved"]
+
+    async def _acquire(self, engine: str) -> PooledContext:
+        idle = self._idle.setdefault(engine, [])
+        while idle:
+            slot = idle.pop()
+            if self._healthy(slot):
+                return slot
+            self._stats["unhealthy"] += 1
+            await self._discard(slot)
+        return await self._new_slot(engine)
+
+    def _release(self, slot: PooledContext, ok: bool, count_use: bool = True) -> None:
+        if count_use:
+            slot.uses += 1
+        if ok and slot.uses < self.context_max_uses and self._healthy(slot):
+            self._idle.setdefault(slot.engine, []).append(slot)
+        else:
+            self._stats["contexts_recycled"] += 1
+            asyncio.ensure_future(self._discard(slot))
+        self._sem(slot.engine).release()
+
+    def _healthy(self, slot: PooledContext) -> bool:
+        try:
+            return bool(slot.browser.is_connected())
+        except Exception:
+            return False
+
+    async def _close_pages(self, slot: Optional[PooledContext]) -> None:
+        if slot is None:
+            return
+        try:
+            for page in list(slot.context.pages):
+                try:
+                    await page.close()
+                except Exception:
+                    pass
+        except Exception:
+            pass
+
+    async def _discard(self, slot: PooledContext) -> None:
+        try:
+            await slot.context.close()
+        except Exception:
+            pass
+        key = id(slot.browser)
+        self._open_per_browser[key] = max(0, self._open_per_browser.get(key, 1) - 1)
+        # Browser reformado: fechar quando o último context sair
+        if slot.browser in self._retired and self._open_per_browser.get(key, 0) == 0:
+            self._retired.remove(slot.browser)
+            self._open_per_browser.pop(key, None)
+            try:
+                await slot.browser.close()
+            except Exception:
+                pass
+
+    async def _browser_for(self, engine: str):
+        async with self._launch_lock:
+            browser = self._browsers.get(engine)
+            stale = browser is not None and (
+                not browser.is_connected() or self._browser_contexts.get(engine, 0) >= self.browser_max_contexts
+            )
+            if stale:
+                self._browsers.pop(engine, None)
+                if self._open_per_browser.get(id(browser), 0) > 0 and browser.is_connected():
+                    self._retired.append(browser)
+                else:
+                    try:
+                        await browser.close()
+                    except Exception:
+                        pass
+                browser = None
+            if browser is None:
+                pw = await self._playwright()
+                browser = await getattr(pw, engine).launch(headless=self.headless)
+                self._browsers[engine] = browser
+                self._browser_contexts[engine] = 0
+                self._stats["browsers_launched"] += 1
+            self._browser_contexts[engine] = self._browser_contexts.get(engine, 0) + 1
+            return browser
+
+    async def _new_slot(self, engine: str) -> PooledContext:
+        browser = await self._browser_for(engine)
+        context = await browser.new_context(locale="pt-PT", user_agent=self.user_agent)
+        self._open_per_browser[id(browser)] = self._open_per_browser.get(id(browser), 0) + 1
+        self._stats["contexts_created"] += 1
+        slot = PooledContext(engine, browser, context)
+        try:
+            await context.add_cookies(CARJET_COOKIES)
+            await context.set_extra_http_headers({"Accept-Language": "pt-PT,pt;q=0.9,en;q=0.8"})
+        except Exception:
+            pass
+        if self.block_resources:
+            slot.filter = RequestFilter(allowed_hosts=self.allowed_hosts, throttle=self.throttle)
+            try:
+                await slot.filter.install(context)
+            except Exception:
+                slot.filter = None
+        slot.warm = await self._warm(context)
+        if not slot.warm:
+            self._stats["warm_failures"] += 1
+        return slot
+
+    async def _warm(self, context: Any) -> bool:
+        """Visita a homepage uma vez e aceita o consentimento de cookies"""
+        page = None
+        try:
+            page = await context.new_page()
+            await page.goto(self.warm_url, wait_until="domcontentloaded", timeout=25000)
+            for sel in CONSENT_SELECTORS:
+                try:
+                    btn = page.locator(sel)
+                    if await btn.count() > 0:
+                        await btn.first.click(timeout=1500)
+                        break
+                except Exception:
+                    continue
+            return True
+        except Exception:
+            return False
+        finally:
+            if page is not None:
+                try:
+                    await page.close()
+                except Exception:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = dict(self._stats)
+        out["avg_lease_wait_ms"] = round(out["lease_wait_ms"] / out["leases"], 1) if out["leases"] else 0.0
+        out["avg_bytes_saved_per_search"] = int(out["bytes_saved"] / out["leases"]) if out["leases"] else 0
+        out["block_resources"] = self.block_resources
+        out["idle"] = {e: len(v) for e, v in self._idle.items()}
+        out["browsers"] = {e: bool(b.is_connected()) for e, b in self._browsers.items()}
+        out["size"] = self.size
+        out["context_max_uses"] = self.context_max_uses
+        return out
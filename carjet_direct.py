@@ -1,14 +1,19 @@
 """
 CarJet Direct API - Parse completo com suppliers e categorias
 """
-import urllib.request
 import urllib.parse
 from datetime import datetime
+import asyncio
+import functools
+import threading
 import uuid
 import re
 import time
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from bs4 import BeautifulSoup
+from http_client import close_http_client, get_http_client
+from strategy_health import NoResults
+from supplier_registry import get_registry as get_supplier_registry
 
 
 def to_carjet_format(dt: datetime) -> str:
@@ -21,65 +26,6 @@ def extract_redirect_url(html: str) -> Optional[str]:
     return match.group(1) if match else None
 
 
-# Mapa de códigos para nomes de suppliers
-SUPPLIER_MAP = {
-    'AUP': 'Auto Prudente Rent a Car',
-    'AUTOPRUDENTE': 'Auto Prudente Rent a Car',
-    'THR': 'Thrifty',
-    'ECR': 'Europcar',
-    'ACE': 'Europcar',  # Ace é o mesmo que Europcar
-    'HER': 'Hertz',
-    'CEN': 'Centauro',
-    'OKR': 'OK Mobility',
-    'SUR': 'Surprice',
-    'GREENMOTION': 'Greenmotion',
-    'GOLDCAR': 'Goldcar',
-    'SIXT': 'Sixt',
-    'SIX': 'Sixt',
-    'ICT': 'Interrent',
-    'BGX': 'Budget',
-    'YNO': 'YesNo',
-    'KED': 'Keddy',
-    'FIR': 'Firefly',
-    'ALM': 'Alamo',
-    'NAT': 'National',
-    'ENT': 'Enterprise',
-    'ABB1': 'Abby Car',
-    'ABB': 'Abby Car',
-    'GDS': 'Goldcar',
-    'REC': 'Record Go',
-    'FLZ': 'Flizzr',
-    'ROD': 'Rhodium',
-    'CAL': 'Caleche',
-    'JUS': 'Justrent',
-    # Suppliers adicionais do CarJet
-    'AVS': 'Avis',
-    'AVI': 'Avis',
-    'DOL': 'Dollar',
-    'ALA': 'Alamo',
-    'LOC': 'Localiza',
-    'MOV': 'Movida',
-    'UNI': 'Unidas',
-    'CAR': 'Carnect',
-    'DRI': 'Drive on Holidays',
-    'KEY': 'KeynGo',
-    'LOY': 'Loyalty',
-    'RHO': 'Rhodium',
-    'WAY': 'Wayzor',
-    'TEL': 'Tellescar',
-    'OTO': 'Otopeni',
-    'MAS': 'Master',
-    'VIC': 'Victoria Cars',
-    'AER': 'Aercar',
-    'FLE': 'Fleet',
-    'TOP': 'TopCar',
-    'LIS': 'Lisbon Cars',
-    'GUA': 'Guerin',
-    'ADA': 'Ada',
-    'IDE': 'Ideamerge',
-}
-
-
 # Mapeamento manual de veículos para categorias
 VEHICLES = {
     # MINI 4 Lugares
@@ -299,33 +245,73 @@ VEHICLES = {
 
 
 def normalize_supplier(name: str) -> str:
-    """Converte código/nome de supplier para nome completo"""
-    if not name:
-        return 'CarJet'
-    
-    name_upper = name.upper().strip()
-    
-    # Tentar extrair código de logo primeiro (ex: logo_AUP.png → AUP)
-    logo_match = re.search(r'logo[_-]([A-Z0-9]+)', name_upper)
-    if logo_match:
-        code = logo_match.group(1)
-        if code in SUPPLIER_MAP:
-            return SUPPLIER_MAP[code]
-    
-    # Tentar match direto
-    if name_upper in SUPPLIER_MAP:
-        return SUPPLIER_MAP[name_upper]
-    
-    # Normalizar nomes comuns
-    for code, full_name in SUPPLIER_MAP.items():
-        if code in name_upper or full_name.upper() in name_upper:
-            return full_name
-    
-    # Se ainda não encontrou e tem logo_, retornar o código
-    if logo_match:
-        return logo_match.group(1).title()
-    
-    return name.strip()
+    """Converte código/nome de supplier para nome completo (registo em supplier_registry)"""
+    return get_supplier_registry().normalize(name)
+
+
+# Índice de VEHICLES para a busca parcial: as chaves ordenadas da mais longa para a mais
+# curta (empate: ordem do dicionário), calculadas uma vez e não a cada chamada. Um trie
+# em Python puro foi medido mais lento que este scan (os "in" correm em C) para ~200
+# chaves. Reconstruído, com o memo limpo, quando VEHICLES muda.
+CATEGORY_MEMO_SIZE = 4096
+
+
+class _VehicleIndex:
+    def __init__(self, vehicles: Dict[str, str]):
+        self.source = vehicles
+        self.size = len(vehicles)
+        self.by_length: Tuple[str, ...] = tuple(sorted(vehicles.keys(), key=len, reverse=True))
+
+    def is_current(self) -> bool:
+        return self.source is VEHICLES and self.size == len(VEHICLES)
+
+    def longest_key(self, text: str) -> Optional[str]:
+        for key in self.by_length:
+            if key in text:
+                return key
+        return None
+
+
+_VEHICLE_INDEX: Optional[_VehicleIndex] = None
+_VEHICLE_INDEX_LOCK = threading.Lock()
+_VEHICLE_INDEX_BUILDS = 0
+
+
+def _vehicle_index() -> _VehicleIndex:
+    global _VEHICLE_INDEX, _VEHICLE_INDEX_BUILDS
+    idx = _VEHICLE_INDEX
+    if idx is not None and idx.is_current():
+        return idx
+    with _VEHICLE_INDEX_LOCK:
+        idx = _VEHICLE_INDEX
+        if idx is None or not idx.is_current():
+            idx = _VehicleIndex(VEHICLES)
+            _VEHICLE_INDEX = idx
+            _VEHICLE_INDEX_BUILDS += 1
+            _detect_category_cached.cache_clear()
+    return idx
+
+
+def invalidate_category_index() -> None:
+    """Chamar depois de alterar VEHICLES no lugar (reload do módulo já começa do zero)"""
+    global _VEHICLE_INDEX
+    with _VEHICLE_INDEX_LOCK:
+        _VEHICLE_INDEX = None
+        _detect_category_cached.cache_clear()
+
+
+def category_index_stats() -> Dict[str, Any]:
+    info = _detect_category_cached.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "vehicles": len(VEHICLES),
+        "index_builds": _VEHICLE_INDEX_BUILDS,
+        "memo_size": info.currsize,
+        "memo_max": info.maxsize,
+        "memo_hits": info.hits,
+        "memo_misses": info.misses,
+        "memo_hit_ratio": round(info.hits / lookups, 3) if lookups else 0.0,
+    }
 
 
 def detect_category_from_car(car_name: str, transmission: str = '') -> str:
@@ -334,6 +320,12 @@ def detect_category_from_car(car_name: str, transmission: str = '') -> str:
     Consulta primeiro o dicionário VEHICLES para mapeamento exato
     Retorna nome descritivo da categoria para exibição na UI
     """
+    _vehicle_index()  # reconstrói índice e memo se VEHICLES mudou
+    return _detect_category_cached(car_name, transmission)
+
+
+@functools.lru_cache(maxsize=CATEGORY_MEMO_SIZE)
+def _detect_category_cached(car_name: str, transmission: str) -> str:
     car = car_name.lower().strip()
     trans = transmission.lower()
     auto = 'auto' in car or 'auto' in trans or 'automatic' in trans
@@ -361,9 +353,9 @@ def detect_category_from_car(car_name: str, transmission: str = '') -> str:
             return VEHICLES[variant]
     
     # Tentar busca parcial (substring match) - do mais específico ao menos específico
-    for key in sorted(VEHICLES.keys(), key=len, reverse=True):
-        if key in car_normalized:
-            return VEHICLES[key]
+    key = _vehicle_index().longest_key(car_normalized)
+    if key is not None:
+        return VEHICLES[key]
     
     # 2. FALLBACK: Regras genéricas caso não encontre no VEHICLES
     # Casos específicos primeiro
@@ -432,67 +424,199 @@ def detect_category_from_car(car_name: str, transmission: str = '') -> str:
     return 'ECONOMY'
 
 
+DIRECT_URL = 'https://www.carjet.com/do/list/pt'
+
+DIRECT_HEADERS = {
+    'Content-Type': 'application/x-www-form-urlencoded',
+    'Accept': 'text/html',
+    'Accept-Language': 'pt-PT,pt;q=0.9',
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
+    'Referer': 'https://www.carjet.com/',
+    'Origin': 'https://www.carjet.com'
+}
+
+LOCATION_CODES = {
+    'faro': 'FAO02',
+    'aeroporto de faro': 'FAO02',
+    'albufeira': 'ABF01',
+    'lisboa': 'LIS01',
+    'porto': 'OPO01',
+    'funchal': 'FNC01',
+    'ponta delgada': 'PDL01',
+}
+
+
+def resolve_pickup_code(location: str) -> str:
+    loc_lower = (location or '').lower()
+    for key, code in LOCATION_CODES.items():
+        if key in loc_lower:
+            return code
+    return 'FAO02'
+
+
+def build_direct_form(location: str, start_dt: datetime, end_dt: datetime) -> Tuple[str, Dict[str, str]]:
+    """Devolve (pickup_code, form_data) para o POST em /do/list/pt"""
+    pickup_code = resolve_pickup_code(location)
+    form_data = {
+        'frmDestino': pickup_code,
+        'frmDestinoFinal': '',
+        'frmFechaRecogida': to_carjet_format(start_dt),
+        'frmFechaDevolucion': to_carjet_format(end_dt),
+        'frmHasAge': 'False',
+        'frmEdad': '35',
+        'frmPrvNo': '',
+        'frmMoneda': 'EUR',
+        'frmMonedaForzada': '',
+        'frmJsonFilterInfo': '',
+        'frmTipoVeh': 'CAR',
+        'idioma': 'PT',
+        'frmSession': str(uuid.uuid4()),
+        'frmDetailCode': ''
+    }
+    return pickup_code, form_data
+
+
+# --- Espera adaptativa pelo redirect "Waiting Prices" ---
+# Em vez de dormir 2s/4s fixos, sondamos o URL de redirect com passos curtos e
+# paramos assim que a lista estiver completa. O tempo observado por localização
+# (média exponencial) define o atraso inicial das pesquisas seguintes. Uma página
+# final sem carros (datas/local sem oferta) também é uma resposta completa.
+POLL_STEPS = (0.4, 0.6, 0.9, 1.3, 1.8)
+POLL_MAX_WAIT = 14.0
+POLL_MAX_WAIT_QUICK = 8.0
+POLL_DEFAULT_INITIAL = 1.5
+POLL_DEFAULT_INITIAL_QUICK = 1.0
+POLL_EMA_ALPHA = 0.3
+
+# A página de resultados declara-se como tal (dataLayer / <body>) mesmo com a lista vazia
+RESULTS_PAGE_RX = re.compile(r'hrental_pagetype"\s*:\s*"searchresults"|data-steplist="list"')
+NO_RESULTS_MARKERS = (
+    'não há carros disponíveis', 'não existem carros disponíveis', 'sem carros disponíveis',
+    'no hay coches disponibles', 'no cars available', 'there are no cars available',
+)
+
+_WAIT_STATS: Dict[str, Dict[str, float]] = globals().get('_WAIT_STATS') or {}
+_WAIT_STATS_LOCK = threading.Lock()
+
+
+def is_no_results_page(html: str) -> bool:
+    """Página final de resultados sem nenhum carro (não vale a pena voltar a sondar)"""
+    if not html or '<article' in html or 'dataMap' in html:
+        return False
+    # O ecrã de espera é o que redireciona; "Waiting Prices" aparece também no
+    # dataLayer (vP-Title) da página final, por isso não serve para os distinguir
+    if extract_redirect_url(html):
+        return False
+    if RESULTS_PAGE_RX.search(html):
+        return True
+    low = html.lower()
+    return any(m in low for m in NO_RESULTS_MARKERS)
+
+
+def is_result_page_complete(html: str) -> bool:
+    """True quando a página já traz a lista de carros, ou a resposta final sem carros (e não o ecrã de espera)"""
+    if not html:
+        return False
+    if '<article' in html or 'dataMap' in html:
+        return True
+    return is_no_results_page(html)
+
+
+def initial_wait_for(pickup_code: str, quick: int = 0) -> float:
+    with _WAIT_STATS_LOCK:
+        st = _WAIT_STATS.get(pickup_code)
+        ema = st.get('ema') if st else None
+    if not ema:
+        return POLL_DEFAULT_INITIAL_QUICK if quick else POLL_DEFAULT_INITIAL
+    # Começar um pouco antes da média para não desperdiçar tempo quando está pronto mais cedo
+    cap = (POLL_MAX_WAIT_QUICK if quick else POLL_MAX_WAIT) / 2
+    return min(max(ema * 0.8, 0.3), cap)
+
+
+def record_wait(pickup_code: str, seconds: float) -> None:
+    with _WAIT_STATS_LOCK:
+        st = _WAIT_STATS.get(pickup_code)
+        if not st:
+            _WAIT_STATS[pickup_code] = {'ema': seconds, 'last': seconds, 'min': seconds, 'max': seconds, 'count': 1}
+            return
+        st['ema'] = POLL_EMA_ALPHA * seconds + (1 - POLL_EMA_ALPHA) * st['ema']
+        st['last'] = seconds
+        st['min'] = min(st['min'], seconds)
+        st['max'] = max(st['max'], seconds)
+        st['count'] += 1
+
+
+def get_wait_stats() -> Dict[str, Dict[str, float]]:
+    with _WAIT_STATS_LOCK:
+        return {code: dict(st) for code, st in _WAIT_STATS.items()}
+
+
+def _poll_delays(pickup_code: str, quick: int = 0):
+    """Gera os atrasos entre sondagens até esgotar o orçamento de espera"""
+    deadline = time.monotonic() + (POLL_MAX_WAIT_QUICK if quick else POLL_MAX_WAIT)
+    yield initial_wait_for(pickup_code, quick)
+    step = 0
+    while time.monotonic() < deadline:
+        yield POLL_STEPS[min(step, len(POLL_STEPS) - 1)]
+        step += 1
+
+
+def _redirect_target(redirect_url: str) -> str:
+    return urllib.parse.urljoin('https://www.carjet.com/', redirect_url)
+
+
+async def poll_redirect_async(client: Any, redirect_url: str, headers: Dict[str, str], pickup_code: str, quick: int = 0) -> str:
+    t0 = time.monotonic()
+    html = ''
+    probes = 0
+    for delay in _poll_delays(pickup_code, quick):
+        await asyncio.sleep(delay)
+        full_url = _redirect_target(redirect_url)
+        sent_at = time.monotonic() - t0
+        probes += 1
+        response = await client.get(full_url, headers=headers)
+        html = response.text
+        if is_result_page_complete(html):
+            record_wait(pickup_code, sent_at)
+            what = "Sem carros disponíveis" if is_no_results_page(html) else "Resultados prontos"
+            print(f"[DIRECT] {what} após {sent_at:.1f}s ({probes} sondagens)")
+            return html
+        redirect_url = extract_redirect_url(html) or redirect_url
+    print(f"[DIRECT] ⚠️ Resultados incompletos após {time.monotonic() - t0:.1f}s ({probes} sondagens)")
+    return html
+
+
 def scrape_carjet_direct(location: str, start_dt: datetime, end_dt: datetime, quick: int = 0) -> List[Dict[str, Any]]:
+    """Entrada síncrona (scripts): corre scrape_carjet_direct_async num event loop próprio"""
+    async def _run() -> List[Dict[str, Any]]:
+        try:
+            return await scrape_carjet_direct_async(location, start_dt, end_dt, quick)
+        finally:
+            # Os pools do cliente partilhado ficam presos a este loop: fechá-los antes de ele acabar
+            await close_http_client()
+    return asyncio.run(_run())
+
+
+async def scrape_carjet_direct_async(location: str, start_dt: datetime, end_dt: datetime, quick: int = 0) -> List[Dict[str, Any]]:
+    """
+    Pesquisa pelo método direto (POST + redirect até a lista estar pronta).
+    Não bloqueia o event loop: HTTP via cliente partilhado (http_client, pool
+    keep-alive por host), espera adaptativa com asyncio.sleep e parse do HTML
+    numa thread. Devolve NoResults() quando o CarJet responde que não há
+    carros; [] quando o pedido falha.
+    """
     try:
         print(f"[DIRECT] Location: {location}, Start: {start_dt}, End: {end_dt}")
         
-        location_codes = {
-            'faro': 'FAO02',
-            'aeroporto de faro': 'FAO02',
-            'albufeira': 'ABF01',
-            'lisboa': 'LIS01',
-            'porto': 'OPO01',
-            'funchal': 'FNC01',
-            'ponta delgada': 'PDL01',
-        }
-        
-        loc_lower = location.lower()
-        pickup_code = 'FAO02'
-        for key, code in location_codes.items():
-            if key in loc_lower:
-                pickup_code = code
-                break
-        
+        pickup_code, form_data = build_direct_form(location, start_dt, end_dt)
         print(f"[DIRECT] Código: {pickup_code}")
         
-        pickup_date = to_carjet_format(start_dt)
-        return_date = to_carjet_format(end_dt)
-        session_id = str(uuid.uuid4())
-        
-        form_data = {
-            'frmDestino': pickup_code,
-            'frmDestinoFinal': '',
-            'frmFechaRecogida': pickup_date,
-            'frmFechaDevolucion': return_date,
-            'frmHasAge': 'False',
-            'frmEdad': '35',
-            'frmPrvNo': '',
-            'frmMoneda': 'EUR',
-            'frmMonedaForzada': '',
-            'frmJsonFilterInfo': '',
-            'frmTipoVeh': 'CAR',
-            'idioma': 'PT',
-            'frmSession': session_id,
-            'frmDetailCode': ''
-        }
-        
-        encoded_data = urllib.parse.urlencode(form_data).encode('utf-8')
-        url = 'https://www.carjet.com/do/list/pt'
-        
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded',
-            'Accept': 'text/html',
-            'Accept-Language': 'pt-PT,pt;q=0.9',
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
-            'Referer': 'https://www.carjet.com/',
-            'Origin': 'https://www.carjet.com'
-        }
+        client = get_http_client()
+        headers = dict(DIRECT_HEADERS)
         
-        print(f"[DIRECT] POST → {url}")
-        req = urllib.request.Request(url, data=encoded_data, headers=headers, method='POST')
-        
-        with urllib.request.urlopen(req, timeout=30) as response:
-            html = response.read().decode('utf-8')
+        print(f"[DIRECT] POST → {DIRECT_URL}")
+        response = await client.post(DIRECT_URL, data=form_data, headers=headers, timeout=30)
+        html = response.text
         
         print(f"[DIRECT] HTML: {len(html)} bytes")
         
@@ -500,20 +624,15 @@ def scrape_carjet_direct(location: str, start_dt: datetime, end_dt: datetime, qu
         if 'Waiting Prices' in html or 'window.location.replace' in html:
             redirect_url = extract_redirect_url(html)
             if redirect_url:
-                wait_time = 2 if quick else 4
-                print(f"[DIRECT] Aguardando {wait_time}s...")
-                time.sleep(wait_time)
-                
-                full_url = f'https://www.carjet.com{redirect_url}'
-                print(f"[DIRECT] Redirect → {full_url[:80]}...")
-                req2 = urllib.request.Request(full_url, headers=headers, method='GET')
-                
-                with urllib.request.urlopen(req2, timeout=30) as response2:
-                    html = response2.read().decode('utf-8')
-                
+                print(f"[DIRECT] Redirect → {_redirect_target(redirect_url)[:80]}...")
+                get_headers = {k: v for k, v in headers.items() if k != 'Content-Type'}
+                html = await poll_redirect_async(client, redirect_url, get_headers, pickup_code, quick)
                 print(f"[DIRECT] HTML final: {len(html)} bytes")
         
-        items = parse_carjet_html_complete(html)
+        if is_no_results_page(html):
+            # Página final sem carros: resposta válida, não uma falha do método direto
+            return NoResults()
+        items = await asyncio.to_thread(parse_carjet_html_complete, html)
         print(f"[DIRECT API] ✅ {len(items)} carros extraídos")
         return items
         
@@ -0,0 +1,182 @@
+"""
+Taxas de câmbio servidas da memória, atualizadas em background
+
+A conversão GBP->EUR dos preços corre dentro de handlers async (parse,
+normalize_and_sort) e fazia um requests.get com timeout de 5s sempre que o
+cache de 1h expirava, ou em cada pedido quando o serviço estava em baixo,
+parando o event loop. Aqui rate() é só uma leitura de dict: quando a taxa está
+velha agenda um refresh numa thread e continua a devolver a última taxa boa.
+Os refreshes agendados, o loop periódico (refresh_stale) e o refresh manual
+passam todos pelo mesmo controlo: um de cada vez por par, e depois de uma
+falha esperam retry_after. A última taxa boa é guardada (load/save fornecidos
+pela app) para sobreviver a restarts; load_saved() lê-a numa thread no arranque
+e nunca no event loop. Uma tabela local de taxas (ficheiro JSON ou set_table)
+substitui a rede para uso offline e testes.
+"""
+
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+
+def pair_key(base: str, quote: str) -> str:
+    return f"{base.upper()}->{quote.upper()}"
+
+
+def load_rate_table(path: str) -> Dict[str, float]:
+    """{"GBP->EUR": 1.16, ...} de um ficheiro JSON (chaves "GBP->EUR" ou "GBP/EUR")"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    table: Dict[str, float] = {}
+    for k, v in (data or {}).items():
+        base, _, quote = str(k).replace("/", "->").partition("->")
+        if base and quote and float(v) > 0:
+            table[pair_key(base.strip(), quote.strip())] = float(v)
+    return table
+
+
+class FxRates:
+    def __init__(self, fetch: Callable[[str, str], Optional[float]], max_age: float = 3600.0,
+                 fallback: Optional[Dict[str, float]] = None, table: Optional[Dict[str, float]] = None,
+                 load: Optional[Callable[[], Dict[str, Tuple[float, float]]]] = None,
+                 save: Optional[Callable[[Dict[str, Tuple[float, float]]], None]] = None,
+                 retry_after: float = 300.0):
+        self._fetch = fetch
+        self.max_age = float(max_age)
+        self.retry_after = float(retry_after)
+        self._fallback = dict(fallback or {})
+        self._table = dict(table or {})
+        self._load = load
+        self._save = save
+        self._rates: Dict[str, Tuple[float, float]] = {}  # key -> (rate, ts)
+        self._loaded = load is None
+        self._inflight: Set[str] = set()
+        self._failed_at: Dict[str, float] = {}  # key -> última tentativa falhada
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.fetches = 0
+        self.fetch_errors = 0
+        self.last_error = ""
+        self.last_fetch_ms: Optional[float] = None
+
+    def set_table(self, table: Optional[Dict[str, float]]) -> None:
+        """Taxas fixas (offline/testes): têm prioridade e desligam a rede para esses pares"""
+        self._table = dict(table or {})
+
+    def load_saved(self) -> None:
+        """Lê as taxas guardadas (bloqueante: no arranque, numa thread); só a primeira chamada conta"""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+        try:
+            for k, (rate, ts) in (self._load() or {}).items():
+                if float(rate) > 0 and k not in self._rates:
+                    self._rates[k] = (float(rate), float(ts))
+        except Exception as e:
+            self.last_error = f"load: {type(e).__name__}: {e}"
+
+    def rate(self, base: str, quote: str) -> float:
+        """Taxa atual sem bloquear: tabela local, última taxa conhecida ou fallback"""
+        self.lookups += 1
+        key = pair_key(base, quote)
+        fixed = self._table.get(key)
+        if fixed is not None:
+            return fixed
+        # Antes de load_saved() só há o fallback; o refresh agendado carrega o guardado na sua thread
+        cached = self._rates.get(key)
+        if cached is None or time.time() - cached[1] >= self.max_age:
+            self._schedule(base, quote)
+        if cached is not None:
+            return cached[0]
+        return self._fallback.get(key, 1.0)
+
+    def _claim(self, key: str, force: bool = False) -> bool:
+        """Single-flight por par: False se já há um refresh a correr ou (sem force) em backoff"""
+        now = time.time()
+        with self._lock:
+            if key in self._inflight:
+                return False
+            if not force and now - self._failed_at.get(key, float("-inf")) < self.retry_after:
+                return False
+            self._inflight.add(key)
+            return True
+
+    def _schedule(self, base: str, quote: str) -> None:
+        key = pair_key(base, quote)
+        if self._claim(key):
+            threading.Thread(target=self._refresh_claimed, args=(base, quote), name=f"fx-refresh-{key}", daemon=True).start()
+
+    def refresh(self, base: str, quote: str, force: bool = True) -> Optional[float]:
+        """Vai buscar a taxa (bloqueante; corre em threads). None se falhou ou se este par já está a ser atualizado"""
+        key = pair_key(base, quote)
+        if key in self._table:
+            return self._table[key]
+        if not self._claim(key, force):
+            return None
+        return self._refresh_claimed(base, quote)
+
+    def _refresh_claimed(self, base: str, quote: str) -> Optional[float]:
+        key = pair_key(base, quote)
+        try:
+            self.load_saved()
+            t0 = time.perf_counter()
+            self.fetches += 1
+            rate = None
+            err = ""
+            try:
+                rate = self._fetch(base.upper(), quote.upper())
+            except Exception as e:
+                err = f"{type(e).__name__}: {e}"
+            self.last_fetch_ms = round((time.perf_counter() - t0) * 1000, 1)
+            if not rate or rate <= 0:
+                self.fetch_errors += 1
+                self.last_error = f"{key}: {err or 'no rate'}"
+                with self._lock:
+                    self._failed_at[key] = time.time()
+                return None
+            self._rates[key] = (float(rate), time.time())
+            with self._lock:
+                self._failed_at.pop(key, None)
+            if self._save is not None:
+                try:
+                    self._save(dict(self._rates))
+                except Exception as e:
+                    self.last_error = f"save: {type(e).__name__}: {e}"
+            return float(rate)
+        finally:
+            with self._lock:
+                self._inflight.discard(key)
+
+    def refresh_stale(self) -> int:
+        """Refresca (bloqueante) os pares com 3/4 de max_age ou mais; para o loop periódico, antes de rate() os ver velhos"""
+        self.load_saved()
+        now = time.time()
+        n = 0
+        for key, (_, ts) in list(self._rates.items()) + [(k, (0.0, 0.0)) for k in self._fallback if k not in self._rates]:
+            if key in self._table or now - ts < self.max_age * 0.75:
+                continue
+            base, _, quote = key.partition("->")
+            if self.refresh(base, quote, force=False) is not None:
+                n += 1
+        return n
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "rates": {k: {"rate": r, "age_s": round(now - ts, 1), "stale": now - ts >= self.max_age}
+                      for k, (r, ts) in self._rates.items()},
+            "table": dict(self._table),
+            "fallback": dict(self._fallback),
+            "max_age_s": self.max_age,
+            "refreshing": sorted(self._inflight),
+            "backoff": sorted(k for k, t in self._failed_at.items() if now - t < self.retry_after),
+            "lookups": self.lookups,
+            "fetches": self.fetches,
+            "fetch_errors": self.fetch_errors,
+            "last_fetch_ms": self.last_fetch_ms,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,326 @@
+"""
+Cliente HTTP unificado (async) para scraping e imagens
+
+Um único ponto de saída HTTP: um pool de ligações httpx por host (keep-alive,
+HTTP/2 quando o pacote h2 está instalado), timeouts configuráveis por host,
+retries com backoff para erros de rede/5xx e encaminhamento opcional pelo
+proxy ScrapeOps. Guarda estatísticas de latência e erros por host. Se tiver um
+RateLimiter (rate_limit.py), cada tentativa espera pelo token do host e o
+status da resposta alimenta o abrandamento automático (429/403). Os redirects
+são seguidos aqui, não pelo httpx, para cada salto passar também pelo limiter
+do seu host.
+"""
+
+import asyncio
+import contextlib
+import http.cookiejar
+import random
+import time
+from collections import deque
+from typing import Any, Dict, Mapping, Optional
+from urllib.parse import urlparse
+
+try:
+    import httpx  # type: ignore
+except Exception:
+    httpx = None
+
+try:
+    import h2  # type: ignore  # noqa: F401
+    _HAS_H2 = True
+except Exception:
+    _HAS_H2 = False
+
+SCRAPEOPS_URL = "https://proxy.scrapeops.io/v1/"
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+DEFAULT_HEADERS = {"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"}
+MAX_REDIRECTS = 10
+
+
+def host_of(url: str) -> str:
+    try:
+        return (urlparse(url).hostname or "").lower()
+    except Exception:
+        return ""
+
+
+def parse_host_timeouts(spec: str) -> Dict[str, float]:
+    """'www.carjet.com=30,proxy.scrapeops.io=60' -> {host: seconds}"""
+    out: Dict[str, float] = {}
+    for part in (spec or "").split(","):
+        if "=" not in part:
+            continue
+        host, _, val = part.partition("=")
+        try:
+            out[host.strip().lower()] = float(val)
+        except ValueError:
+            continue
+    return out
+
+
+class HostStats:
+    """Latência (janela das últimas N amostras) e erros de um host"""
+
+    def __init__(self, window: int = 256):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.statuses: Dict[int, int] = {}
+        self.latencies: deque = deque(maxlen=window)
+        self.total_ms = 0.0
+        self.last_error = ""
+
+    def record(self, ms: float, status: Optional[int] = None, error: Optional[str] = None) -> None:
+        self.requests += 1
+        self.total_ms += ms
+        self.latencies.append(ms)
+        if status is not None:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+        if error is not None or (status is not None and status >= 500):
+            self.errors += 1
+            self.last_error = error or f"HTTP {status}"
+
+    def snapshot(self) -> Dict[str, Any]:
+        lat = sorted(self.latencies)
+
+        def _pct(p: float) -> float:
+            if not lat:
+                return 0.0
+            return round(lat[min(len(lat) - 1, int(p * len(lat)))], 1)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": round(self.errors / self.requests, 4) if self.requests else 0.0,
+            "retries": self.retries,
+            "avg_ms": round(self.total_ms / self.requests, 1) if self.requests else 0.0,
+            "p50_ms": _pct(0.5),
+            "p95_ms": _pct(0.95),
+            "max_ms": round(lat[-1], 1) if lat else 0.0,
+            "statuses": dict(self.statuses),
+            "last_error": self.last_error,
+        }
+
+
+class HttpClient:
+    def __init__(self, timeout: float = 20.0, connect_timeout: float = 6.0, retries: int = 1,
+                 backoff: float = 0.5, http2: bool = True, max_connections: int = 32,
+                 max_keepalive: int = 16, keepalive_expiry: float = 60.0,
+                 host_timeouts: Optional[Mapping[str, float]] = None,
+                 proxy_service: str = "", proxy_api_key: str = "", proxy_country: str = "",
+                 proxy_url: str = "", limiter: Any = None):
+        self.timeout = float(timeout)
+        self.connect_timeout = float(connect_timeout)
+        self.retries = max(0, int(retries))
+        self.backoff = float(backoff)
+        self.http2 = bool(http2) and _HAS_H2
+        self.max_connections = int(max_connections)
+        self.max_keepalive = int(max_keepalive)
+        self.keepalive_expiry = float(keepalive_expiry)
+        self.host_timeouts = {k.lower(): float(v) for k, v in (host_timeouts or {}).items()}
+        self.proxy_service = (proxy_service or "").strip().lower()
+        self.proxy_api_key = proxy_api_key or ""
+        self.proxy_country = (proxy_country or "").strip()
+        self.proxy_url = (proxy_url or "").strip()
+        self.limiter = limiter
+        self._clients: Dict[str, Any] = {}
+        self._stats: Dict[str, HostStats] = {}
+
+    # --- Pools por host ---
+    def _client_for(self, host: str):
+        if httpx is None:
+            raise RuntimeError("httpx is not installed")
+        client = self._clients.get(host)
+        if client is None or client.is_closed:
+            kwargs: Dict[str, Any] = dict(
+                timeout=httpx.Timeout(self.timeout_for(host), connect=self.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+                headers=DEFAULT_HEADERS,
+                http2=self.http2,
+                # Sem cookie jar: pedidos em paralelo não partilham sessão; cookies vão explícitos nos headers
+                cookies=http.cookiejar.CookieJar(policy=http.cookiejar.DefaultCookiePolicy(allowed_domains=[])),
+                follow_redirects=True,
+            )
+            if self.proxy_url and host != host_of(SCRAPEOPS_URL):
+                kwargs["proxy"] = self.proxy_url
+            client = self._clients[host] = httpx.AsyncClient(**kwargs)
+        return client
+
+    def timeout_for(self, host: str) -> float:
+        return self.host_timeouts.get(host, self.timeout)
+
+    def _host_stats(self, host: str) -> HostStats:
+        st = self._stats.get(host)
+        if st is None:
+            st = self._stats[host] = HostStats()
+        return st
+
+    # --- Pedidos ---
+    async def request(self, method: str, url: str, *, headers: Optional[Mapping[str, str]] = None,
+                      params: Any = None, data: Any = None, timeout: Optional[float] = None,
+                      retries: Optional[int] = None, follow_redirects: Optional[bool] = None):
+        """Pedido com retries (erros de rede e 5xx); devolve o httpx.Response da última tentativa
+
+        follow_redirects=False devolve o 3xx a quem chamou (ex.: sessões que levam as cookies à mão).
+        """
+        host = host_of(url)
+        client = self._client_for(host)
+        st = self._host_stats(host)
+        attempts = 1 + (self.retries if retries is None else max(0, int(retries)))
+        kwargs: Dict[str, Any] = {"headers": dict(headers or {})}
+        if params is not None:
+            kwargs["params"] = params
+        if data is not None:
+            kwargs["data"] = data
+        if timeout is not None:
+            kwargs["timeout"] = httpx.Timeout(float(timeout), connect=min(self.connect_timeout, float(timeout)))
+        follow = True if follow_redirects is None else bool(follow_redirects)
+        for attempt in range(attempts):
+            if attempt:
+                st.retries += 1
+                await asyncio.sleep(self.backoff * (2 ** (attempt - 1)) * (1 + random.random() * 0.25))
+            if self.limiter is not None:
+                await self.limiter.acquire(url)
+            t0 = time.perf_counter()
+            try:
+                resp = await self._send(client, method, url, kwargs, follow)
+            except httpx.TransportError as e:
+                st.record((time.perf_counter() - t0) * 1000, error=f"{type(e).__name__}: {e}")
+                if attempt + 1 >= attempts:
+                    raise
+                continue
+            st.record((time.perf_counter() - t0) * 1000, status=resp.status_code)
+            if self.limiter is not None:
+                self.limiter.observe(str(resp.url), resp.status_code, resp.headers.get("retry-after"))
+            if resp.status_code in RETRY_STATUSES and attempt + 1 < attempts:
+                continue
+            return resp
+        raise RuntimeError("unreachable")
+
+    async def _send(self, client: Any, method: str, url: str, kwargs: Dict[str, Any], follow: bool):
+        """Um pedido; com follow, cada redirect é um salto próprio com token do limiter do seu host"""
+        resp = await client.request(method, url, follow_redirects=False, **kwargs)
+        history = []
+        while follow and resp.next_request is not None and len(history) < MAX_REDIRECTS:
+            nxt = resp.next_request
+            history.append(resp)
+            if self.limiter is not None:
+                self.limiter.observe(str(resp.url), resp.status_code, resp.headers.get("retry-after"))
+                await self.limiter.acquire(str(nxt.url))
+            resp = await self._client_for(host_of(str(nxt.url))).send(nxt, follow_redirects=False)
+        if history:
+            resp.history = history
+        return resp
+
+    @contextlib.asynccontextmanager
+    async def stream(self, method: str, url: str, *, headers: Optional[Mapping[str, str]] = None,
+                     data: Any = None, timeout: Optional[float] = None):
+        """Pedido único (sem retries) com o corpo lido aos bocados dentro do with (resp.aiter_text)"""
+        host = host_of(url)
+        client = self._client_for(host)
+        st = self._host_stats(host)
+        kwargs: Dict[str, Any] = {"headers": dict(headers or {})}
+        if data is not None:
+            kwargs["data"] = data
+        if timeout is not None:
+            kwargs["timeout"] = httpx.Timeout(float(timeout), connect=min(self.connect_timeout, float(timeout)))
+        if self.limiter is not None:
+            await self.limiter.acquire(url)
+        t0 = time.perf_counter()
+        recorded = False
+        try:
+            async with client.stream(method, url, **kwargs) as resp:
+                # Latência até aos headers; o corpo chega enquanto quem chamou o consome
+                st.record((time.perf_counter() - t0) * 1000, status=resp.status_code)
+                recorded = True
+                if self.limiter is not None:
+                    self.limiter.observe(url, resp.status_code, resp.headers.get("retry-after"))
+                yield resp
+        except httpx.TransportError as e:
+            if not recorded:
+                st.record((time.perf_counter() - t0) * 1000, error=f"{type(e).__name__}: {e}")
+            raise
+
+    async def get(self, url: str, **kwargs: Any):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any):
+        return await self.request("POST", url, **kwargs)
+
+    async def head(self, url: str, **kwargs: Any):
+        return await self.request("HEAD", url, **kwargs)
+
+    # --- Proxy (ScrapeOps) ---
+    @property
+    def proxy_enabled(self) -> bool:
+        return self.proxy_service == "scrapeops" and bool(self.proxy_api_key)
+
+    async def proxied(self, method: str, url: str, *, headers: Optional[Mapping[str, str]] = None,
+                      data: Any = None, render_js: bool = True, timeout: Optional[float] = None):
+        """Pedido via ScrapeOps; em 401/403 ou erro do proxy volta ao pedido direto"""
+        if not self.proxy_enabled:
+            return await self.request(method, url, headers=headers, data=data, timeout=timeout)
+        params = {"api_key": self.proxy_api_key, "url": url}
+        if render_js:
+            params["render_js"] = "true"
+        if self.proxy_country:
+            params["country"] = self.proxy_country
+        try:
+            r = await self.request(method, SCRAPEOPS_URL, params=params, headers=headers, data=data, timeout=timeout)
+            if r.status_code not in (401, 403):
+                return r
+        except Exception:
+            pass
+        return await self.request(method, url, headers=headers, data=data, timeout=timeout)
+
+    # --- Ciclo de vida / stats ---
+    async def close(self) -> None:
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for c in clients:
+            try:
+                await c.aclose()
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "http2": self.http2,
+            "timeout": self.timeout,
+            "retries": self.retries,
+            "proxy": self.proxy_service if self.proxy_enabled else "",
+            "hosts": {h: s.snapshot() for h, s in sorted(self._stats.items())},
+            "open_pools": sorted(h for h, c in self._clients.items() if not c.is_closed),
+        }
+
+
+# --- Instância partilhada pelo processo ---
+_CLIENT: Optional[HttpClient] = None
+_CONFIG: Dict[str, Any] = {}
+
+
+def configure(**kwargs: Any) -> None:
+    """Define a configuração do cliente partilhado (aplica-se na próxima criação)"""
+    global _CLIENT
+    _CONFIG.clear()
+    _CONFIG.update(kwargs)
+    if _CLIENT is not None and not _CLIENT._clients:
+        _CLIENT = None
+
+
+def get_http_client() -> HttpClient:
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = HttpClient(**_CONFIG)
+    return _CLIENT
+
+
+async def close_http_client() -> None:
+    global _CLIENT
+    client = _CLIENT
+    _CLIENT = None
+    if client is not None:
+        await client.close()
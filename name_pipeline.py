@@ -0,0 +1,91 @@
+"""
+Pipeline memoizado de normalização de nomes de carros
+
+clean_car_name + map_category_to_group correm para cada item de cada pesquisa,
+mas os ~200 modelos repetem-se em todas. Este LRU (limitado em entradas)
+guarda o resultado por (nome, categoria) e devolve nome limpo, categoria e
+grupo de uma vez. Conta hits/misses e é esvaziado quando o catálogo de
+veículos ou os overrides de nomes mudam.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class NamePipeline:
+    def __init__(self, clean: Callable[[str], str], group: Callable[[str, str], str], maxsize: int = 4096):
+        self._clean = clean
+        self._group = group
+        self.maxsize = max(1, int(maxsize))
+        self._names: "OrderedDict[Tuple[Any, Any], Tuple[str, str]]" = OrderedDict()
+        self._groups: "OrderedDict[Tuple[Any, Any], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.last_invalidated: Optional[float] = None
+        self.last_reason = ""
+
+    def _get(self, cache: "OrderedDict", key: Tuple[Any, Any]) -> Any:
+        with self._lock:
+            v = cache.get(key)
+            if v is not None:
+                cache.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return v
+
+    def _put(self, cache: "OrderedDict", key: Tuple[Any, Any], value: Any) -> None:
+        with self._lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > self.maxsize:
+                cache.popitem(last=False)
+                self.evictions += 1
+
+    def normalize(self, car: str, category: str, group: str = "") -> Tuple[str, str, str]:
+        """(nome limpo, categoria, grupo); um grupo já conhecido prevalece sobre o mapeado"""
+        key = (car, category)
+        v = self._get(self._names, key)
+        if v is None:
+            clean = self._clean(car)
+            v = (clean, self._group(category, clean))
+            self._put(self._names, key, v)
+        return v[0], category, group or v[1]
+
+    def group(self, category: str, car_name: str = "") -> str:
+        """map_category_to_group memoizado (caminho dos parse engines)"""
+        key = (category, car_name)
+        v = self._get(self._groups, key)
+        if v is None:
+            v = self._group(category, car_name)
+            self._put(self._groups, key, v)
+        return v
+
+    def invalidate(self, reason: str = "") -> None:
+        with self._lock:
+            self._names.clear()
+            self._groups.clear()
+            self.invalidations += 1
+            self.last_invalidated = time.time()
+            self.last_reason = reason
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._names) + len(self._groups),
+            "names": len(self._names),
+            "groups": len(self._groups),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "last_invalidated": self.last_invalidated,
+            "last_reason": self.last_reason,
+        }
@@ -0,0 +1,156 @@
+"""
+Cache de resultados do parse_prices por hash do HTML
+
+Retries do bulk, fallbacks do ScraperAPI e refreshes repetidos do /api/prices
+descarregam muitas vezes páginas do CarJet byte a byte iguais. A chave é um
+hash rápido (blake2b) do HTML + base_url + "salt" (versão do parser e
+configuração que muda o resultado), por isso páginas idênticas saltam o parse.
+LRU em memória e, opcionalmente, ficheiros .json.gz em disco que sobrevivem a
+restarts. Conta hits/misses e o tempo de CPU poupado (o custo medido do parse
+original de cada entrada servida).
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+Items = List[Dict[str, Any]]
+
+
+def page_key(html: str, base_url: str, salt: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(salt.encode("utf-8"))
+    h.update(b"\0")
+    h.update((base_url or "").encode("utf-8"))
+    h.update(b"\0")
+    h.update((html or "").encode("utf-8", "surrogatepass"))
+    return h.hexdigest()
+
+
+class ParseCache:
+    def __init__(self, max_entries: int = 64, disk_dir: Optional[str] = None, disk_max_files: int = 2000):
+        self.max_entries = max(0, int(max_entries))
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_files = max(1, int(disk_max_files))
+        self._mem: "OrderedDict[str, Tuple[Items, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.cpu_saved_s = 0.0
+        self.parse_time_s = 0.0
+        self.disk_errors = 0
+        self._disk_writes = 0
+        if self.disk_dir is not None:
+            try:
+                self.disk_dir.mkdir(parents=True, exist_ok=True)
+            except Exception:
+                self.disk_dir = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or self.disk_dir is not None
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / f"{key}.json.gz"
+
+    def get(self, key: str) -> Optional[Items]:
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                self.cpu_saved_s += entry[1]
+                return [dict(it) for it in entry[0]]
+        if self.disk_dir is not None:
+            try:
+                with gzip.open(self._disk_path(key), "rt", encoding="utf-8") as f:
+                    data = json.load(f)
+                items, cost = data["items"], float(data.get("cost_s") or 0.0)
+                self._remember(key, items, cost)
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                    self.cpu_saved_s += cost
+                return [dict(it) for it in items]
+            except FileNotFoundError:
+                pass
+            except Exception:
+                self.disk_errors += 1
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _remember(self, key: str, items: Items, cost_s: float) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._mem[key] = (items, cost_s)
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_entries:
+                self._mem.popitem(last=False)
+
+    def put(self, key: str, items: Items, cost_s: float) -> None:
+        """Guarda uma cópia (quem chamou pode alterar os dicts devolvidos)"""
+        items = [dict(it) for it in items]
+        self._remember(key, items, cost_s)
+        with self._lock:
+            self.stores += 1
+            self.parse_time_s += cost_s
+        if self.disk_dir is None:
+            return
+        try:
+            tmp = self._disk_path(key).with_suffix(".tmp")
+            with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=5) as f:
+                json.dump({"items": items, "cost_s": cost_s, "ts": time.time()}, f, ensure_ascii=False)
+            os.replace(tmp, self._disk_path(key))
+            self._disk_writes += 1
+            if self._disk_writes % 100 == 0:
+                self._prune_disk()
+        except Exception:
+            self.disk_errors += 1
+
+    def _prune_disk(self) -> None:
+        files = sorted(self.disk_dir.glob("*.json.gz"), key=lambda p: p.stat().st_mtime)
+        for p in files[:max(0, len(files) - self.disk_max_files)]:
+            try:
+                p.unlink()
+            except Exception:
+                pass
+
+    def clear(self, disk: bool = False) -> int:
+        with self._lock:
+            n = len(self._mem)
+            self._mem.clear()
+        if disk and self.disk_dir is not None:
+            for p in self.disk_dir.glob("*.json.gz"):
+                try:
+                    p.unlink()
+                    n += 1
+                except Exception:
+                    pass
+        return n
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._mem),
+            "max_entries": self.max_entries,
+            "disk_dir": str(self.disk_dir) if self.disk_dir is not None else None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "cpu_saved_s": round(self.cpu_saved_s, 3),
+            "parse_time_s": round(self.parse_time_s, 3),
+            "disk_errors": self.disk_errors,
+        }
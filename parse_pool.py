@@ -0,0 +1,197 @@
+"""
+Pool de processos para o parse das páginas de preços
+
+O parse com BeautifulSoup/lxml segura o GIL, por isso com asyncio.to_thread
+todas as páginas de um bulk-prices são analisadas num só core e os fetches
+ficam à espera. Com workers > 0 o parse corre num ProcessPoolExecutor (spawn)
+cujos processos são aquecidos no arranque (importam a app e bs4/lxml uma vez)
+e recebem a configuração do parser no initializer. Quando a configuração muda
+o pool é reciclado; se o pool não arranca ou parte, o parse volta a correr em
+threads. Guarda contagens e tempos para /admin/parse-pool-stats.
+
+Os workers chamam-se "parse-worker-..." (nome definido antes de a app ser
+importada no processo novo), para a app poder saltar com in_worker() o que só
+o processo principal deve fazer no import (DB, threads, caches persistentes).
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.context import ForkProcess, ForkServerProcess, SpawnProcess
+from typing import Any, Callable, Dict, Optional, Tuple
+
+WORKER_NAME_PREFIX = "parse-worker"
+
+
+def in_worker() -> bool:
+    """True dentro de um processo do pool (já durante o import da app)"""
+    return multiprocessing.current_process().name.startswith(WORKER_NAME_PREFIX)
+
+
+# O spawn passa o nome do processo ao filho antes de des-serializar o initializer
+# (que importa a app), por isso o nome já está certo durante esse import
+class _SpawnWorker(SpawnProcess):
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.name = f"{WORKER_NAME_PREFIX}-{self.name}"
+
+
+class _ForkServerWorker(ForkServerProcess):
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.name = f"{WORKER_NAME_PREFIX}-{self.name}"
+
+
+class _ForkWorker(ForkProcess):
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.name = f"{WORKER_NAME_PREFIX}-{self.name}"
+
+
+_WORKER_PROCESS = {"spawn": _SpawnWorker, "forkserver": _ForkServerWorker, "fork": _ForkWorker}
+
+
+def _worker_context(start_method: str):
+    ctx = multiprocessing.get_context(start_method)
+
+    class _Context(type(ctx)):
+        Process = _WORKER_PROCESS[start_method]
+    return _Context()
+
+
+def _ping(delay: float) -> int:
+    # Mantém o worker ocupado um pouco para que cada ping acorde um processo diferente
+    time.sleep(delay)
+    return os.getpid()
+
+
+class ParsePool:
+    def __init__(self, workers: int, run: Callable[..., Any], initializer: Optional[Callable[..., None]] = None,
+                 config: Callable[[], Tuple[Any, ...]] = tuple, start_method: str = "spawn"):
+        self.workers = max(0, int(workers))
+        self._run = run
+        self._initializer = initializer
+        self._config = config
+        self._start_method = start_method
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._disabled_reason = ""
+        self.generation = 0
+        self.pool_tasks = 0
+        self.thread_tasks = 0
+        self.fallbacks = 0
+        self.broken = 0
+        self.recycles = 0
+        self.pool_ms = 0.0
+        self.thread_ms = 0.0
+        self.warm_pids: list = []
+        self.warm_ms: Optional[float] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0 and not self._disabled_reason
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            if self._executor is None:
+                try:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=_worker_context(self._start_method),
+                        initializer=self._initializer,
+                        initargs=self._config(),
+                    )
+                    self.generation += 1
+                except Exception as e:
+                    # Sem suporte para processos (sandbox, /dev/shm): fica em threads
+                    self._disabled_reason = f"{type(e).__name__}: {e}"
+                    return None
+            return self._executor
+
+    def warm(self) -> None:
+        """Arranca todos os workers (bloqueante; chamar numa thread)"""
+        ex = self._get_executor()
+        if ex is None:
+            return
+        t0 = time.perf_counter()
+        try:
+            futs = [ex.submit(_ping, 0.2) for _ in range(self.workers)]
+            self.warm_pids = sorted(set(f.result(timeout=120) for f in futs))
+            self.warm_ms = round((time.perf_counter() - t0) * 1000, 1)
+        except Exception as e:
+            self._drop(ex, f"warm: {type(e).__name__}: {e}")
+
+    def recycle(self) -> None:
+        """A configuração do parser mudou: os próximos pedidos usam workers novos"""
+        with self._lock:
+            ex, self._executor = self._executor, None
+        if ex is not None:
+            self.recycles += 1
+            ex.shutdown(wait=False, cancel_futures=False)
+
+    def _drop(self, ex: ProcessPoolExecutor, reason: str) -> None:
+        self.broken += 1
+        with self._lock:
+            if self._executor is ex:
+                self._executor = None
+        try:
+            ex.shutdown(wait=False, cancel_futures=True)
+        except Exception:
+            pass
+        print(f"[PARSE-POOL] worker pool dropped ({reason}); parsing in threads until it restarts", flush=True)
+
+    async def run(self, *args: Any) -> Any:
+        """run(*args) num worker; em threads quando o pool está desligado ou partiu"""
+        ex = self._get_executor()
+        if ex is not None:
+            t0 = time.perf_counter()
+            try:
+                result = await asyncio.get_running_loop().run_in_executor(ex, self._run, *args)
+                self.pool_tasks += 1
+                self.pool_ms += (time.perf_counter() - t0) * 1000
+                return result
+            except BrokenProcessPool as e:
+                self._drop(ex, f"BrokenProcessPool: {e}")
+                self.fallbacks += 1
+            except RuntimeError as e:
+                # Pool reciclado/fechado entre o get e o submit
+                if "shutdown" not in str(e):
+                    raise
+                self.fallbacks += 1
+        t0 = time.perf_counter()
+        result = await asyncio.to_thread(self._run, *args)
+        self.thread_tasks += 1
+        self.thread_ms += (time.perf_counter() - t0) * 1000
+        return result
+
+    def shutdown(self) -> None:
+        with self._lock:
+            ex, self._executor = self._executor, None
+        if ex is not None:
+            ex.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "enabled": self.enabled,
+            "running": self._executor is not None,
+            "disabled_reason": self._disabled_reason,
+            "start_method": self._start_method,
+            "cpu_count": os.cpu_count(),
+            "generation": self.generation,
+            "recycles": self.recycles,
+            "warm_pids": list(self.warm_pids),
+            "warm_ms": self.warm_ms,
+            "pool_tasks": self.pool_tasks,
+            "pool_avg_ms": round(self.pool_ms / self.pool_tasks, 1) if self.pool_tasks else 0.0,
+            "thread_tasks": self.thread_tasks,
+            "thread_avg_ms": round(self.thread_ms / self.thread_tasks, 1) if self.thread_tasks else 0.0,
+            "fallbacks": self.fallbacks,
+            "broken": self.broken,
+        }
@@ -0,0 +1,246 @@
+"""
+Segundo nível persistente (SQLite) para caches de respostas
+
+O Render adormece e faz redeploys, e o cache em memória do /api/prices perde-se
+a cada arranque, por isso as primeiras pesquisas depois de acordar iam sempre
+ao CarJet a frio. Aqui cada entrada (chave = pesquisa normalizada) fica numa
+tabela SQLite com o payload em JSON comprimido (zlib) e o prazo de expiração.
+As escritas são feitas por uma thread própria em lotes (a última escrita de
+cada chave ganha), para o event loop nunca esperar pelo disco. No arranque
+recent() devolve as entradas mais recentes ainda válidas para aquecer a
+memória. Conta leituras, escritas, lotes e erros para o admin.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+class PersistentCache:
+    def __init__(self, path: str, max_rows: int = 2000, flush_delay: float = 0.5):
+        self.path = Path(path)
+        self.max_rows = max(1, int(max_rows))
+        self.flush_delay = max(0.0, float(flush_delay))
+        self._pending: Dict[str, Optional[Tuple[float, float, Any]]] = {}  # None = delete
+        self._cond = threading.Condition()
+        self._read_lock = threading.Lock()
+        self._closed = False
+        self._writing = 0
+        self.reads = 0
+        self.read_hits = 0
+        self.writes = 0
+        self.deletes = 0
+        self.batches = 0
+        self.purged = 0
+        self.errors = 0
+        self.last_error = ""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        con = self._connect()
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                " key TEXT PRIMARY KEY, ts REAL NOT NULL, expires REAL NOT NULL,"
+                " size INTEGER NOT NULL, payload BLOB NOT NULL)"
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_ts ON response_cache(ts)")
+            con.commit()
+        finally:
+            con.close()
+        self._reader = self._connect()
+        self._writer = threading.Thread(target=self._write_loop, name="persistent-cache-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(str(self.path), timeout=10, check_same_thread=False)
+
+    @staticmethod
+    def _encode(value: Any) -> bytes:
+        return zlib.compress(json.dumps(value, ensure_ascii=False, default=str, separators=(",", ":")).encode("utf-8"), 6)
+
+    @staticmethod
+    def _decode(blob: bytes) -> Any:
+        return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+    def _error(self, where: str, e: Exception) -> None:
+        self.errors += 1
+        self.last_error = f"{where}: {type(e).__name__}: {e}"
+
+    def get(self, key: Hashable) -> Optional[Tuple[float, float, Any]]:
+        """(ts, expires, valor) se existe e não expirou; as escritas pendentes contam"""
+        k = str(key)
+        now = time.time()
+        self.reads += 1
+        with self._cond:
+            if k in self._pending:
+                hit = self._pending[k]
+                if hit is None or hit[1] <= now:
+                    return None
+                self.read_hits += 1
+                return hit
+        try:
+            with self._read_lock:
+                row = self._reader.execute(
+                    "SELECT ts, expires, payload FROM response_cache WHERE key = ? AND expires > ?", (k, now)
+                ).fetchone()
+            if row is None:
+                return None
+            value = self._decode(row[2])
+        except Exception as e:
+            self._error("get", e)
+            return None
+        self.read_hits += 1
+        return row[0], row[1], value
+
+    def recent(self, limit: int) -> List[Tuple[str, float, float, Any]]:
+        """Entradas válidas mais recentes, da mais antiga para a mais nova (ordem para aquecer um LRU)"""
+        if limit <= 0:
+            return []
+        out: List[Tuple[str, float, float, Any]] = []
+        try:
+            with self._read_lock:
+                rows = self._reader.execute(
+                    "SELECT key, ts, expires, payload FROM response_cache WHERE expires > ? ORDER BY ts DESC LIMIT ?",
+                    (time.time(), int(limit)),
+                ).fetchall()
+        except Exception as e:
+            self._error("recent", e)
+            return out
+        for key, ts, expires, blob in reversed(rows):
+            try:
+                out.append((key, ts, expires, self._decode(blob)))
+            except Exception as e:
+                self._error("recent", e)
+        return out
+
+    def put(self, key: Hashable, value: Any, ts: float, expires: float) -> None:
+        """Agenda a escrita (não bloqueia; a compressão corre na thread de escrita)"""
+        with self._cond:
+            if self._closed:
+                return
+            self._pending[str(key)] = (ts, expires, value)
+            self._cond.notify()
+
+    def delete(self, key: Hashable) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._pending[str(key)] = None
+            self._cond.notify()
+
+    def _write_loop(self) -> None:
+        con = self._connect()
+        try:
+            while True:
+                with self._cond:
+                    while not self._pending and not self._closed:
+                        self._cond.wait()
+                    if not self._pending and self._closed:
+                        return
+                # Junta as escritas que chegam entretanto num só commit
+                if self.flush_delay and not self._closed:
+                    time.sleep(self.flush_delay)
+                with self._cond:
+                    batch, self._pending = self._pending, {}
+                    self._writing = len(batch)
+                self._write_batch(con, batch)
+                with self._cond:
+                    self._writing = 0
+                    self._cond.notify_all()
+        finally:
+            con.close()
+
+    def _write_batch(self, con: sqlite3.Connection, batch: Dict[str, Optional[Tuple[float, float, Any]]]) -> None:
+        rows = []
+        dels = []
+        for k, v in batch.items():
+            if v is None:
+                dels.append((k,))
+                continue
+            try:
+                blob = self._encode(v[2])
+            except Exception as e:
+                self._error("encode", e)
+                continue
+            rows.append((k, v[0], v[1], len(blob), blob))
+        try:
+            with con:
+                if rows:
+                    con.executemany(
+                        "INSERT OR REPLACE INTO response_cache (key, ts, expires, size, payload) VALUES (?,?,?,?,?)", rows
+                    )
+                if dels:
+                    con.executemany("DELETE FROM response_cache WHERE key = ?", dels)
+                cur = con.execute("DELETE FROM response_cache WHERE expires <= ?", (time.time(),))
+                purged = cur.rowcount or 0
+                cur = con.execute(
+                    "DELETE FROM response_cache WHERE key IN ("
+                    " SELECT key FROM response_cache ORDER BY ts DESC LIMIT -1 OFFSET ?)",
+                    (self.max_rows,),
+                )
+                purged += cur.rowcount or 0
+            self.writes += len(rows)
+            self.deletes += len(dels)
+            self.purged += purged
+            self.batches += 1
+        except Exception as e:
+            self._error("write", e)
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Espera até as escritas pendentes estarem no disco"""
+        deadline = time.time() + timeout
+        with self._cond:
+            self._cond.notify()
+            while (self._pending or self._writing) and time.time() < deadline:
+                self._cond.wait(0.1)
+            return not (self._pending or self._writing)
+
+    def clear(self) -> None:
+        with self._cond:
+            self._pending.clear()
+        try:
+            with self._read_lock:
+                with self._reader:
+                    self._reader.execute("DELETE FROM response_cache")
+        except Exception as e:
+            self._error("clear", e)
+
+    def close(self, timeout: float = 5.0) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._writer.join(timeout)
+        with self._read_lock:
+            try:
+                self._reader.close()
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        rows = stored = 0
+        try:
+            with self._read_lock:
+                rows, stored = self._reader.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM response_cache"
+                ).fetchone()
+        except Exception as e:
+            self._error("stats", e)
+        return {
+            "path": str(self.path),
+            "rows": rows,
+            "max_rows": self.max_rows,
+            "compressed_bytes": stored,
+            "pending": len(self._pending) + self._writing,
+            "reads": self.reads,
+            "read_hits": self.read_hits,
+            "writes": self.writes,
+            "deletes": self.deletes,
+            "batches": self.batches,
+            "purged": self.purged,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
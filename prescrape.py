@@ -0,0 +1,301 @@
+"""
+Pré-scrape agendado da grelha localização × data de levantamento × duração
+
+Percorre as combinações mais pesquisadas (por omissão Faro e Albufeira, próximos
+60 dias, durações 1-9, 14, 22, 31 e 60) fora das horas de ponta, guarda os
+resultados em price_snapshots e aquece a cache de pesquisas para que as
+pesquisas interativas sejam servidas logo. Cada célula tem um intervalo de
+atualização que depende da antecedência: datas próximas são refeitas mais
+vezes. Os pedidos passam pelo rate limiter partilhado (caller "prescrape"),
+por isso ficam dentro do orçamento de pedidos e cedem a vez às pesquisas
+interativas. No primeiro ciclo a última atualização de cada célula vem de
+load_done (os price_snapshots já guardados), para um restart não refazer a
+grelha toda; células que saem da grelha são esquecidas.
+"""
+
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+DEFAULT_DURATIONS = [1, 2, 3, 4, 5, 6, 7, 8, 9, 14, 22, 31, 60]
+
+Cell = Tuple[str, str, int]  # (localização, YYYY-MM-DD, dias)
+
+
+def parse_windows(spec: str) -> List[Tuple[int, int]]:
+    """'00:30-07:00,13:00-14:00' -> [(início, fim)] em minutos do dia (pode passar a meia-noite)"""
+    out: List[Tuple[int, int]] = []
+    for part in (spec or "").split(","):
+        a, _, b = part.strip().partition("-")
+        try:
+            ha, _, ma = a.strip().partition(":")
+            hb, _, mb = b.strip().partition(":")
+            start = int(ha) * 60 + int(ma or 0)
+            end = int(hb) * 60 + int(mb or 0)
+        except ValueError:
+            continue
+        out.append((start % 1440, end % 1440))
+    return out
+
+
+def in_windows(windows: List[Tuple[int, int]], now: datetime) -> bool:
+    """Sem janelas configuradas = sempre permitido"""
+    if not windows:
+        return True
+    m = now.hour * 60 + now.minute
+    for start, end in windows:
+        if start <= end:
+            if start <= m < end:
+                return True
+        elif m >= start or m < end:
+            return True
+    return False
+
+
+def parse_priorities(spec: str) -> List[Tuple[int, float]]:
+    """'7=6,21=12,60=24' -> [(até N dias de antecedência, refrescar a cada H horas)] ordenado"""
+    out: List[Tuple[int, float]] = []
+    for part in (spec or "").split(","):
+        k, _, v = part.strip().partition("=")
+        try:
+            out.append((int(k), float(v)))
+        except ValueError:
+            continue
+    return sorted(out)
+
+
+class PrescrapeScheduler:
+    def __init__(self, fetch: Callable[[str, datetime, datetime], Awaitable[List[Dict[str, Any]]]],
+                 store: Callable[[str, datetime, int, List[Dict[str, Any]]], None],
+                 locations: List[str], days_ahead: int = 60, durations: Optional[List[int]] = None,
+                 pickup_time: str = "10:00", windows: str = "", priorities: str = "7=6,21=12,60=24",
+                 concurrency: int = 2, pause: float = 1.0, check_interval: float = 60.0,
+                 is_blocked: Optional[Callable[[str], bool]] = None,
+                 load_done: Optional[Callable[[], Dict[Cell, float]]] = None):
+        self.fetch = fetch
+        self.store = store
+        self.locations = [l for l in locations if l]
+        self.days_ahead = max(1, int(days_ahead))
+        self.durations = list(durations or DEFAULT_DURATIONS)
+        self.pickup_time = pickup_time or "10:00"
+        self.windows_spec = windows
+        self.windows = parse_windows(windows)
+        self.priorities = parse_priorities(priorities) or [(self.days_ahead, 24.0)]
+        self.concurrency = max(1, int(concurrency))
+        self.pause = max(0.0, float(pause))
+        self.check_interval = max(5.0, float(check_interval))
+        self.is_blocked = is_blocked
+        self.load_done = load_done
+        self._seeded = False
+        self._last_done: Dict[Cell, float] = {}
+        self._last_error: Dict[Cell, str] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._force = asyncio.Event()
+        self.running_cycle = False
+        self.current: List[Cell] = []
+        self.stats: Dict[str, Any] = {
+            "cycles": 0, "cells_ok": 0, "cells_empty": 0, "cells_failed": 0, "cells_skipped": 0, "cells_seeded": 0,
+            "items_stored": 0, "last_cycle_started": None, "last_cycle_finished": None,
+            "last_cycle_cells": 0, "last_cycle_s": None, "last_error": "",
+        }
+
+    # --- Grelha e prioridades ---
+    def refresh_interval(self, days_ahead: int) -> float:
+        """Segundos entre atualizações de uma célula com esta antecedência"""
+        for limit, hours in self.priorities:
+            if days_ahead <= limit:
+                return hours * 3600
+        return self.priorities[-1][1] * 3600
+
+    def grid(self, today: Optional[date] = None) -> List[Cell]:
+        today = today or date.today()
+        cells: List[Cell] = []
+        for offset in range(1, self.days_ahead + 1):
+            d = (today + timedelta(days=offset)).isoformat()
+            for loc in self.locations:
+                for dur in self.durations:
+                    cells.append((loc, d, int(dur)))
+        return cells
+
+    def due_cells(self, now: Optional[float] = None) -> List[Cell]:
+        """Células por fazer, as mais atrasadas (e mais próximas) primeiro"""
+        now = now or time.time()
+        today = date.today()
+        due: List[Tuple[bool, int, float, Cell]] = []
+        for cell in self.grid(today):
+            ahead = (date.fromisoformat(cell[1]) - today).days
+            last = self._last_done.get(cell)
+            next_at = (last or 0.0) + self.refresh_interval(ahead)
+            if next_at <= now:
+                # Nunca feitas primeiro; depois por antecedência (datas próximas antes)
+                due.append((last is not None, ahead, next_at, cell))
+        due.sort(key=lambda t: t[:3])
+        return [t[3] for t in due]
+
+    async def seed(self) -> int:
+        """Última atualização de cada célula da grelha a partir de load_done (lido numa thread, uma vez)"""
+        self._seeded = True
+        if self.load_done is None:
+            return 0
+        try:
+            done = await asyncio.to_thread(self.load_done)
+        except Exception as e:
+            self.stats["last_error"] = f"seed: {type(e).__name__}: {e}"
+            return 0
+        cells = set(self.grid())
+        n = 0
+        for cell, ts in (done or {}).items():
+            if cell in cells and ts > self._last_done.get(cell, 0.0):
+                self._last_done[cell] = ts
+                n += 1
+        self.stats["cells_seeded"] = n
+        return n
+
+    def _prune(self) -> None:
+        # Datas que já passaram (ou localizações/durações retiradas) não voltam à grelha
+        cells = set(self.grid())
+        for d in (self._last_done, self._last_error):
+            for cell in [c for c in d if c not in cells]:
+                del d[cell]
+
+    # --- Execução ---
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except BaseException:
+                pass
+
+    def trigger(self) -> None:
+        """Corre um ciclo já, mesmo fora da janela"""
+        self._force.set()
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._force.wait(), timeout=self.check_interval)
+            except asyncio.TimeoutError:
+                pass
+            forced = self._force.is_set()
+            self._force.clear()
+            if not forced and not in_windows(self.windows, datetime.now()):
+                continue
+            try:
+                await self.run_cycle(respect_window=not forced)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["last_error"] = f"{type(e).__name__}: {e}"
+
+    async def run_cycle(self, respect_window: bool = True) -> int:
+        if self.running_cycle:
+            return 0
+        self.running_cycle = True
+        try:
+            if not self._seeded:
+                await self.seed()
+            self._prune()
+        except BaseException:
+            self.running_cycle = False
+            raise
+        t0 = time.time()
+        self.stats["cycles"] += 1
+        self.stats["last_cycle_started"] = t0
+        queue: "asyncio.Queue[Cell]" = asyncio.Queue()
+        for cell in self.due_cells(t0):
+            queue.put_nowait(cell)
+        done = 0
+
+        async def _worker():
+            nonlocal done
+            while not queue.empty():
+                # Saiu da janela a meio do ciclo: o que falta fica para a próxima
+                if respect_window and not in_windows(self.windows, datetime.now()):
+                    return
+                cell = queue.get_nowait()
+                await self._run_cell(cell)
+                done += 1
+                if self.pause:
+                    await asyncio.sleep(self.pause)
+
+        try:
+            await asyncio.gather(*[_worker() for _ in range(self.concurrency)])
+        finally:
+            self.running_cycle = False
+            self.current = []
+            self.stats["last_cycle_finished"] = time.time()
+            self.stats["last_cycle_cells"] = done
+            self.stats["last_cycle_s"] = round(time.time() - t0, 1)
+        return done
+
+    async def _run_cell(self, cell: Cell) -> None:
+        loc, day, dur = cell
+        if self.is_blocked is not None and self.is_blocked(loc):
+            self.stats["cells_skipped"] += 1
+            return
+        start_dt = datetime.fromisoformat(f"{day}T{self.pickup_time}")
+        end_dt = start_dt + timedelta(days=dur)
+        self.current.append(cell)
+        try:
+            items = await self.fetch(loc, start_dt, end_dt)
+            if items:
+                self.store(loc, start_dt, dur, items)
+                self.stats["cells_ok"] += 1
+                self.stats["items_stored"] += len(items)
+                self._last_error.pop(cell, None)
+            else:
+                self.stats["cells_empty"] += 1
+            self._last_done[cell] = time.time()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Falhou: fica devida para o próximo ciclo
+            self.stats["cells_failed"] += 1
+            self._last_error[cell] = f"{type(e).__name__}: {e}"
+            self.stats["last_error"] = f"{loc} {day} {dur}d: {self._last_error[cell]}"
+        finally:
+            try:
+                self.current.remove(cell)
+            except ValueError:
+                pass
+
+    # --- Estado ---
+    def status(self) -> Dict[str, Any]:
+        now = time.time()
+        today = date.today()
+        grid = self.grid(today)
+        fresh = 0
+        per_location: Dict[str, Dict[str, int]] = {}
+        for cell in grid:
+            ahead = (date.fromisoformat(cell[1]) - today).days
+            ok = self._last_done.get(cell, 0.0) + self.refresh_interval(ahead) > now
+            fresh += ok
+            loc = per_location.setdefault(cell[0], {"cells": 0, "fresh": 0})
+            loc["cells"] += 1
+            loc["fresh"] += ok
+        out: Dict[str, Any] = dict(self.stats)
+        out.update({
+            "enabled": self._task is not None and not self._task.done(),
+            "running": self.running_cycle,
+            "in_window": in_windows(self.windows, datetime.now()),
+            "windows": self.windows_spec or "always",
+            "priorities_hours": {f"<= {d}d": h for d, h in self.priorities},
+            "locations": self.locations,
+            "durations": self.durations,
+            "days_ahead": self.days_ahead,
+            "grid_cells": len(grid),
+            "fresh_cells": fresh,
+            "due_cells": len(grid) - fresh,
+            "coverage": round(fresh / len(grid), 3) if grid else 0.0,
+            "per_location": per_location,
+            "current": [f"{l} {d} {n}d" for l, d, n in self.current],
+            "recent_errors": {f"{l} {d} {n}d": e for (l, d, n), e in list(self._last_error.items())[-10:]},
+        })
+        return out
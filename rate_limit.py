@@ -0,0 +1,193 @@
+"""
+Rate limiter por host (token bucket) partilhado pelo processo
+
+Cada host upstream (carjet.com, CDN de imagens, ScrapeOps, ...) tem um bucket
+com taxa (pedidos/s) e burst. Os pedidos em espera são servidos em round-robin
+por "caller" (bulk, track, img, ...) para que um bulk grande não bloqueie uma
+pesquisa interativa. Respostas 429/403 reduzem a taxa para metade (e respeitam
+Retry-After); depois de um período sem bloqueios a taxa volta a subir aos poucos.
+"""
+
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+# Caller atual (herdado pelas tasks criadas dentro do contexto)
+current_caller: contextvars.ContextVar[str] = contextvars.ContextVar("rate_limit_caller", default="default")
+
+THROTTLE_STATUSES = (429, 403)
+
+
+def parse_rules(spec: str) -> List[Tuple[str, float, float]]:
+    """'carjet.com=5:10,www.carjet.com/cdn/=20:40' -> [(key, rate, burst)]"""
+    out: List[Tuple[str, float, float]] = []
+    for part in (spec or "").split(","):
+        key, _, val = part.strip().partition("=")
+        if not key or not val:
+            continue
+        rate_s, _, burst_s = val.partition(":")
+        try:
+            rate = float(rate_s)
+            burst = float(burst_s) if burst_s else max(1.0, rate)
+        except ValueError:
+            continue
+        out.append((key.strip().lower(), rate, burst))
+    return out
+
+
+class TokenBucket:
+    def __init__(self, name: str, rate: float, burst: float, min_rate: Optional[float] = None,
+                 recover_after: float = 10.0, recover_step: float = 0.1):
+        self.name = name
+        self.base_rate = max(0.01, float(rate))
+        self.rate = self.base_rate
+        self.burst = max(1.0, float(burst))
+        self.min_rate = min_rate if min_rate is not None else max(0.05, self.base_rate / 16)
+        self.recover_after = recover_after
+        self.recover_step = recover_step
+        self.tokens = self.burst
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._last_throttle = 0.0
+        self._last_recover = 0.0
+        self._queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._pump: Optional[asyncio.Task] = None
+        self.stats = {"granted": 0, "waited": 0, "wait_ms": 0, "throttled": 0}
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def _waiting(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    async def acquire(self, caller: str = "default") -> None:
+        self._refill()
+        if not self._waiting() and self.tokens >= 1 and time.monotonic() >= self._paused_until:
+            self.tokens -= 1
+            self.stats["granted"] += 1
+            return
+        t0 = time.monotonic()
+        fut = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(caller, deque()).append(fut)
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.ensure_future(self._run_pump())
+        await fut
+        self.stats["waited"] += 1
+        self.stats["wait_ms"] += int((time.monotonic() - t0) * 1000)
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        # Round-robin entre callers: serve um e passa o caller para o fim da fila
+        while self._queues:
+            caller, q = next(iter(self._queues.items()))
+            self._queues.move_to_end(caller)
+            while q:
+                fut = q.popleft()
+                if not fut.done():
+                    if not q:
+                        self._queues.pop(caller, None)
+                    return fut
+            self._queues.pop(caller, None)
+        return None
+
+    async def _run_pump(self) -> None:
+        while self._waiting():
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+            fut = self._next_waiter()
+            if fut is None:
+                break
+            self.tokens -= 1
+            self.stats["granted"] += 1
+            fut.set_result(None)
+
+    def observe(self, status: Optional[int], retry_after: Optional[float] = None) -> None:
+        """Ajusta a taxa a partir da resposta (AIMD)"""
+        now = time.monotonic()
+        if status in THROTTLE_STATUSES:
+            self.stats["throttled"] += 1
+            # Um único corte por janela de 1s (respostas em paralelo ao mesmo bloqueio)
+            if now - self._last_throttle > 1.0:
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.tokens = 0.0
+            self._last_throttle = now
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + min(float(retry_after), 120.0))
+            return
+        # Sem bloqueios há recover_after segundos: sobe um passo (no máximo um por segundo)
+        if self.rate < self.base_rate and now - self._last_throttle > self.recover_after and now - self._last_recover >= 1.0:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * self.recover_step)
+            self._last_recover = now
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._refill()
+        out: Dict[str, Any] = dict(self.stats)
+        out.update({
+            "rate": round(self.rate, 3),
+            "base_rate": self.base_rate,
+            "burst": self.burst,
+            "tokens": round(self.tokens, 2),
+            "waiting": self._waiting(),
+            "callers_waiting": {c: len(q) for c, q in self._queues.items() if q},
+            "paused_for_s": round(max(0.0, self._paused_until - time.monotonic()), 1),
+            "avg_wait_ms": round(self.stats["wait_ms"] / self.stats["waited"], 1) if self.stats["waited"] else 0.0,
+        })
+        return out
+
+
+class RateLimiter:
+    """Buckets por regra 'host[/prefixo]' (sufixo do host, prefixo do path; a mais específica ganha)"""
+
+    def __init__(self, rules: List[Tuple[str, float, float]], default_rate: float = 10.0, default_burst: float = 20.0):
+        self.default_rate = default_rate
+        self.default_burst = default_burst
+        self._rules: List[Tuple[str, str, float, float]] = []
+        for key, rate, burst in rules:
+            host, _, path = key.partition("/")
+            self._rules.append((host, "/" + path if path else "", rate, burst))
+        # Mais específico primeiro: host mais longo, depois path mais longo
+        self._rules.sort(key=lambda r: (len(r[0]), len(r[1])), reverse=True)
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def bucket_for(self, url: str) -> TokenBucket:
+        try:
+            pr = urlparse(url)
+            host = (pr.hostname or "").lower()
+            path = pr.path or "/"
+        except Exception:
+            host, path = "", "/"
+        for rhost, rpath, rate, burst in self._rules:
+            if (host == rhost or host.endswith("." + rhost)) and (not rpath or path.startswith(rpath)):
+                return self._bucket(rhost + rpath, rate, burst)
+        return self._bucket(host, self.default_rate, self.default_burst)
+
+    def _bucket(self, name: str, rate: float, burst: float) -> TokenBucket:
+        b = self._buckets.get(name)
+        if b is None:
+            b = self._buckets[name] = TokenBucket(name, rate, burst)
+        return b
+
+    async def acquire(self, url: str, caller: Optional[str] = None) -> None:
+        await self.bucket_for(url).acquire(caller or current_caller.get())
+
+    def observe(self, url: str, status: Optional[int], retry_after: Optional[str] = None) -> None:
+        ra: Optional[float] = None
+        if retry_after:
+            try:
+                ra = float(retry_after)
+            except ValueError:
+                ra = None
+        self.bucket_for(url).observe(status, ra)
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: b.snapshot() for name, b in sorted(self._buckets.items())}
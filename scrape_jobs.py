@@ -0,0 +1,479 @@
+"""
+Scrape job queue - pesquisas longas em background
+
+Submeter devolve logo um job id; um pool limitado de workers asyncio corre o
+handler registado para o tipo de job (track-by-params, track-by-url,
+bulk-prices) e o cliente consulta o progresso/resultados parciais por polling
+ou subscreve eventos (SSE). Os jobs ficam na tabela scrape_jobs do SQLite para
+que um restart não perca trabalho em fila. Os resultados parciais são linhas
+acrescentadas a scrape_job_partials (uma por entrada, pequenas: os items
+completos só vão no result), para cada atualização não regravar a lista toda.
+
+O SQLite nunca é usado no event loop: as leituras correm em asyncio.to_thread
+e as escritas vão, por ordem, para uma única task que as executa numa thread.
+O estado dos jobs a correr vive em memória (é daí que o SSE e o GET leem); sai
+de memória quando o estado final já está gravado. Um job recuperado depois de
+um restart recomeça do zero, sem os parciais da tentativa anterior. Os jobs
+acabados há mais de retention_days são apagados periodicamente.
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+FINAL_STATES = (JOB_DONE, JOB_FAILED)
+
+_JOB_COLUMNS = "id, kind, params, status, progress, message, partial, result, error, created_by, created_at, started_at, finished_at, attempts"
+
+
+class JobContext:
+    """Passado ao handler: parâmetros do job + callbacks de progresso"""
+
+    def __init__(self, queue: "ScrapeJobQueue", job_id: str, kind: str, params: Dict[str, Any]):
+        self.queue = queue
+        self.job_id = job_id
+        self.kind = kind
+        self.params = params
+
+    def progress(self, done: int, total: int, message: str = "") -> None:
+        pct = round(100.0 * done / total, 1) if total else 0.0
+        self.queue._set(self.job_id, progress=pct, message=message)
+
+    def add_partial(self, entry: Dict[str, Any]) -> None:
+        self.queue._add_partial(self.job_id, entry)
+
+
+Handler = Callable[[JobContext], Awaitable[Dict[str, Any]]]
+
+
+class ScrapeJobQueue:
+    def __init__(self, connect: Callable[[], Any], lock: Any, workers: int = 3):
+        self._connect = connect
+        self._lock = lock
+        self.workers = max(1, int(workers or 1))
+        self._handlers: Dict[str, Handler] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._writes: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._writer: Optional[asyncio.Task] = None
+        self._purger: Optional[asyncio.Task] = None
+        self._live: Dict[str, Dict[str, Any]] = {}  # jobs a correr: estado completo em memória
+        self._versions: Dict[str, int] = {}
+        self._changed: Optional[asyncio.Condition] = None
+        self.write_errors = 0
+
+    # --- DB (bloqueante: só em threads) ---
+    def ensure_table(self) -> None:
+        with self._lock:
+            con = self._connect()
+            try:
+                con.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS scrape_jobs (
+                      id TEXT PRIMARY KEY,
+                      kind TEXT NOT NULL,
+                      params TEXT,
+                      status TEXT NOT NULL,
+                      progress REAL DEFAULT 0,
+                      message TEXT,
+                      partial TEXT,
+                      result TEXT,
+                      error TEXT,
+                      created_by TEXT,
+                      created_at REAL,
+                      started_at REAL,
+                      finished_at REAL,
+                      attempts INTEGER DEFAULT 0
+                    )
+                    """
+                )
+                con.execute("CREATE INDEX IF NOT EXISTS idx_scrape_jobs_status ON scrape_jobs(status, created_at)")
+                con.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS scrape_job_partials (
+                      job_id TEXT NOT NULL,
+                      seq INTEGER NOT NULL,
+                      entry TEXT NOT NULL,
+                      PRIMARY KEY (job_id, seq)
+                    )
+                    """
+                )
+                con.commit()
+            finally:
+                con.close()
+
+    def _db_update(self, job_id: str, fields: Dict[str, Any]) -> None:
+        cols = ", ".join(f"{k}=?" for k in fields)
+        with self._lock:
+            con = self._connect()
+            try:
+                con.execute(f"UPDATE scrape_jobs SET {cols} WHERE id=?", (*fields.values(), job_id))
+                con.commit()
+            finally:
+                con.close()
+
+    def _db_add_partial(self, job_id: str, seq: int, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            con = self._connect()
+            try:
+                con.execute(
+                    "INSERT OR REPLACE INTO scrape_job_partials (job_id, seq, entry) VALUES (?,?,?)",
+                    (job_id, seq, json.dumps(entry)),
+                )
+                con.commit()
+            finally:
+                con.close()
+
+    def _db_clear_partials(self, job_id: str) -> None:
+        with self._lock:
+            con = self._connect()
+            try:
+                con.execute("DELETE FROM scrape_job_partials WHERE job_id=?", (job_id,))
+                con.execute("UPDATE scrape_jobs SET partial=NULL WHERE id=?", (job_id,))
+                con.commit()
+            finally:
+                con.close()
+
+    def _load_partials(self, con: Any, job_id: str) -> Optional[List[Dict[str, Any]]]:
+        rows = con.execute(
+            "SELECT entry FROM scrape_job_partials WHERE job_id=? ORDER BY seq", (job_id,)
+        ).fetchall()
+        if not rows:
+            return None
+        out = []
+        for (v,) in rows:
+            try:
+                out.append(json.loads(v))
+            except Exception:
+                pass
+        return out
+
+    def _row_to_dict(self, r) -> Dict[str, Any]:
+        def _load(v, default):
+            try:
+                return json.loads(v) if v else default
+            except Exception:
+                return default
+        return {
+            "id": r[0],
+            "kind": r[1],
+            "params": _load(r[2], {}),
+            "status": r[3],
+            "progress": r[4] or 0,
+            "message": r[5] or "",
+            "partial": _load(r[6], []),
+            "result": _load(r[7], None),
+            "error": r[8],
+            "created_by": r[9],
+            "created_at": r[10],
+            "started_at": r[11],
+            "finished_at": r[12],
+            "attempts": r[13] or 0,
+        }
+
+    def _db_get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            con = self._connect()
+            try:
+                r = con.execute(f"SELECT {_JOB_COLUMNS} FROM scrape_jobs WHERE id=?", (job_id,)).fetchone()
+                parts = self._load_partials(con, job_id) if r else None
+            finally:
+                con.close()
+        if not r:
+            return None
+        job = self._row_to_dict(r)
+        # Jobs gravados antes da tabela de parciais ainda têm a lista na coluna partial
+        if parts is not None:
+            job["partial"] = parts
+        return job
+
+    def _db_list(self, created_by: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        sql = "SELECT id, kind, status, progress, message, error, created_by, created_at, started_at, finished_at FROM scrape_jobs"
+        args: List[Any] = []
+        if created_by:
+            sql += " WHERE created_by=?"
+            args.append(created_by)
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        args.append(int(limit))
+        with self._lock:
+            con = self._connect()
+            try:
+                rows = con.execute(sql, args).fetchall()
+            finally:
+                con.close()
+        keys = ("id", "kind", "status", "progress", "message", "error", "created_by", "created_at", "started_at", "finished_at")
+        return [dict(zip(keys, r)) for r in rows]
+
+    def _db_insert(self, job_id: str, kind: str, params: Dict[str, Any], created_by: Optional[str]) -> None:
+        with self._lock:
+            con = self._connect()
+            try:
+                con.execute(
+                    "INSERT INTO scrape_jobs (id, kind, params, status, progress, created_by, created_at) VALUES (?,?,?,?,?,?,?)",
+                    (job_id, kind, json.dumps(params or {}), JOB_QUEUED, 0, created_by, time.time()),
+                )
+                con.commit()
+            finally:
+                con.close()
+
+    def _db_purge(self, older_than_days: int) -> int:
+        cutoff = time.time() - older_than_days * 86400
+        with self._lock:
+            con = self._connect()
+            try:
+                con.execute(
+                    "DELETE FROM scrape_job_partials WHERE job_id IN ("
+                    " SELECT id FROM scrape_jobs WHERE status IN (?, ?) AND finished_at < ?)",
+                    (JOB_DONE, JOB_FAILED, cutoff),
+                )
+                cur = con.execute(
+                    "DELETE FROM scrape_jobs WHERE status IN (?, ?) AND finished_at < ?",
+                    (JOB_DONE, JOB_FAILED, cutoff),
+                )
+                con.commit()
+                return cur.rowcount or 0
+            finally:
+                con.close()
+
+    def _db_requeue(self) -> List[str]:
+        with self._lock:
+            con = self._connect()
+            try:
+                # Jobs que estavam a correr quando o processo morreu voltam para a fila
+                con.execute("UPDATE scrape_jobs SET status=? WHERE status=?", (JOB_QUEUED, JOB_RUNNING))
+                con.commit()
+                return [r[0] for r in con.execute(
+                    "SELECT id FROM scrape_jobs WHERE status=? ORDER BY created_at", (JOB_QUEUED,)
+                ).fetchall()]
+            finally:
+                con.close()
+
+    # --- API ---
+    def register(self, kind: str, handler: Handler) -> None:
+        self._handlers[kind] = handler
+
+    def kinds(self) -> List[str]:
+        return sorted(self._handlers)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        live = self._live.get(job_id)
+        if live is not None:
+            return self._snapshot(live)
+        return await asyncio.to_thread(self._db_get, job_id)
+
+    async def list(self, created_by: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._db_list, created_by, limit)
+
+    async def purge(self, older_than_days: int = 7) -> int:
+        return await asyncio.to_thread(self._db_purge, older_than_days)
+
+    async def submit(self, kind: str, params: Dict[str, Any], created_by: Optional[str] = None) -> str:
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = uuid.uuid4().hex
+        await asyncio.to_thread(self._db_insert, job_id, kind, params, created_by)
+        if self._queue is not None:
+            self._queue.put_nowait(job_id)
+        return job_id
+
+    async def start(self, retention_days: int = 7, purge_every: float = 6 * 3600) -> None:
+        """Cria a tabela, volta a pôr em fila jobs interrompidos e arranca os workers e a limpeza"""
+        if self._tasks:
+            return
+        await asyncio.to_thread(self.ensure_table)
+        self._queue = asyncio.Queue()
+        self._writes = asyncio.Queue()
+        self._changed = asyncio.Condition()
+        self._writer = asyncio.create_task(self._write_loop())
+        pending = await asyncio.to_thread(self._db_requeue)
+        for job_id in pending:
+            self._queue.put_nowait(job_id)
+        if pending:
+            print(f"[JOBS] {len(pending)} job(s) recuperados da fila", flush=True)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._purger = asyncio.create_task(self._purge_loop(retention_days, purge_every))
+
+    async def stop(self) -> None:
+        for t in self._tasks + ([self._purger] if self._purger else []):
+            t.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._purger = None
+        if self._writer is not None and self._writes is not None:
+            # Deixar chegar ao disco as escritas já em fila
+            try:
+                await asyncio.wait_for(self._writes.join(), timeout=5.0)
+            except asyncio.TimeoutError:
+                pass
+            self._writer.cancel()
+            await asyncio.gather(self._writer, return_exceptions=True)
+            self._writer = None
+
+    async def subscribe(self, job_id: str, timeout: float = 15.0):
+        """Gera snapshots do job sempre que muda; termina quando o job acaba"""
+        job = await self.get(job_id)
+        if job is None:
+            return
+        last_version = self._versions.get(job_id, 0)
+        yield job
+        while job["status"] not in FINAL_STATES:
+            if self._changed is None:
+                await asyncio.sleep(1.0)
+            else:
+                async with self._changed:
+                    try:
+                        await asyncio.wait_for(
+                            self._changed.wait_for(lambda: self._versions.get(job_id, 0) != last_version),
+                            timeout=timeout,
+                        )
+                    except asyncio.TimeoutError:
+                        pass  # keep-alive: voltar a emitir o estado atual
+            live = self._live.get(job_id)
+            # Fora de memória: ainda em fila, ou acabado (o estado final já está na DB)
+            job = self._snapshot(live) if live is not None else await self.get(job_id)
+            if job is None:
+                return
+            last_version = self._versions.get(job_id, 0)
+            yield job
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "running": len(self._live),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "pending_writes": self._writes.qsize() if self._writes is not None else 0,
+            "write_errors": self.write_errors,
+        }
+
+    # --- Internos ---
+    @staticmethod
+    def _snapshot(live: Dict[str, Any]) -> Dict[str, Any]:
+        return dict(live, partial=list(live.get("partial") or []))
+
+    def _write(self, fn: Callable[..., Any], *args: Any) -> Optional[asyncio.Future]:
+        """Agenda uma escrita (por ordem); devolve um future que acaba quando está gravada"""
+        if self._writes is None:
+            fn(*args)
+            return None
+        done = asyncio.get_running_loop().create_future()
+        self._writes.put_nowait((fn, args, done))
+        return done
+
+    async def _write_loop(self) -> None:
+        assert self._writes is not None
+        while True:
+            fn, args, done = await self._writes.get()
+            try:
+                await asyncio.to_thread(fn, *args)
+            except Exception as e:
+                self.write_errors += 1
+                print(f"[JOBS] erro a gravar job: {e}", flush=True)
+            finally:
+                if not done.done():
+                    done.set_result(None)
+                self._writes.task_done()
+
+    async def _purge_loop(self, retention_days: int, every: float) -> None:
+        while True:
+            try:
+                n = await self.purge(retention_days)
+                if n:
+                    print(f"[JOBS] {n} job(s) antigos apagados", flush=True)
+            except Exception as e:
+                print(f"[JOBS] erro na limpeza: {e}", flush=True)
+            await asyncio.sleep(max(60.0, every))
+
+    @staticmethod
+    def _db_row(fields: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: json.dumps(v) if isinstance(v, (dict, list)) else v for k, v in fields.items()}
+
+    def _set(self, job_id: str, **fields: Any) -> None:
+        if not fields:
+            return
+        live = self._live.get(job_id)
+        if live is not None:
+            live.update(fields)
+        self._notify(job_id)
+        self._write(self._db_update, job_id, self._db_row(fields))
+
+    def _add_partial(self, job_id: str, entry: Dict[str, Any]) -> None:
+        live = self._live.get(job_id)
+        if live is None:
+            return
+        parts = live.setdefault("partial", [])
+        parts.append(entry)
+        self._notify(job_id)
+        self._write(self._db_add_partial, job_id, len(parts) - 1, entry)
+
+    async def _finish(self, job_id: str, **fields: Any) -> None:
+        """Estado final: grava primeiro, depois larga o estado em memória e a versão do job"""
+        done = self._write(self._db_update, job_id, self._db_row(fields))
+        if done is not None:
+            await done
+        self._live.pop(job_id, None)
+        self._versions.pop(job_id, None)
+        self._notify(job_id, bump=False)
+
+    def _notify(self, job_id: str, bump: bool = True) -> None:
+        if bump:
+            self._versions[job_id] = self._versions.get(job_id, 0) + 1
+        cond = self._changed
+        if cond is None:
+            return
+
+        async def _wake():
+            async with cond:
+                cond.notify_all()
+        try:
+            asyncio.get_running_loop().create_task(_wake())
+        except RuntimeError:
+            pass
+
+    async def _worker(self, n: int) -> None:
+        assert self._queue is not None
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[JOBS] worker {n} erro inesperado em {job_id}: {e}", flush=True)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        job = await asyncio.to_thread(self._db_get, job_id)
+        if not job or job["status"] != JOB_QUEUED:
+            return
+        if job.get("partial"):
+            # Recuperado depois de um restart: corre outra vez do zero, sem os parciais antigos
+            await asyncio.to_thread(self._db_clear_partials, job_id)
+        job["partial"] = []
+        self._live[job_id] = job
+        handler = self._handlers.get(job["kind"])
+        if handler is None:
+            await self._finish(job_id, status=JOB_FAILED, error=f"Unknown job kind: {job['kind']}", finished_at=time.time())
+            return
+        self._set(job_id, status=JOB_RUNNING, started_at=time.time(), attempts=int(job.get("attempts") or 0) + 1)
+        ctx = JobContext(self, job_id, job["kind"], job.get("params") or {})
+        t0 = time.time()
+        try:
+            result = await handler(ctx)
+        except asyncio.CancelledError:
+            # Shutdown: o job fica 'running' e volta para a fila no próximo arranque
+            self._live.pop(job_id, None)
+            raise
+        except Exception as e:
+            await self._finish(job_id, status=JOB_FAILED, error=str(e), finished_at=time.time())
+            print(f"[JOBS] {job['kind']} {job_id} falhou: {e}", flush=True)
+            return
+        await self._finish(job_id, status=JOB_DONE, progress=100.0, result=result, finished_at=time.time())
+        print(f"[JOBS] {job['kind']} {job_id} concluído em {int((time.time() - t0) * 1000)}ms", flush=True)
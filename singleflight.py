@@ -0,0 +1,82 @@
+"""
+Single-flight - junta pesquisas idênticas em curso numa só chamada upstream
+
+Enquanto uma pesquisa (mesma localização, datas, moeda e idioma) está a correr,
+os pedidos iguais que chegam esperam pelo mesmo resultado em vez de lançarem
+outro fetch + parse. O trabalho corre numa task própria, por isso um cliente
+que desliga não cancela a pesquisa dos restantes.
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+
+def search_key(location_code: str, start_dt: datetime, end_dt: datetime, currency: str = "EUR", lang: str = "pt") -> Tuple[str, ...]:
+    """Descritor normalizado de uma pesquisa CarJet"""
+    return (
+        (location_code or "").strip().upper(),
+        start_dt.strftime("%Y-%m-%dT%H:%M"),
+        end_dt.strftime("%Y-%m-%dT%H:%M"),
+        (currency or "EUR").strip().upper(),
+        (lang or "pt").strip().lower(),
+    )
+
+
+def normalize_search_url(url: str) -> str:
+    """URL com a query ordenada, para que a mesma pesquisa dê sempre a mesma chave"""
+    try:
+        pr = urlparse(url)
+        q = urlencode(sorted(parse_qsl(pr.query, keep_blank_values=True)))
+        return urlunparse((pr.scheme, pr.netloc.lower(), pr.path, pr.params, q, ""))
+    except Exception:
+        return url
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _kind_stats(self, kind: str) -> Dict[str, int]:
+        st = self._stats.get(kind)
+        if st is None:
+            st = self._stats[kind] = {"calls": 0, "executions": 0, "coalesced": 0, "errors": 0}
+        return st
+
+    async def do(self, kind: str, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Corre fn() uma vez por (kind, key) em simultâneo; os restantes recebem o mesmo resultado"""
+        st = self._kind_stats(kind)
+        st["calls"] += 1
+        full_key = (kind, key)
+        fut = self._inflight.get(full_key)
+        if fut is None:
+            st["executions"] += 1
+            fut = asyncio.ensure_future(fn())
+            self._inflight[full_key] = fut
+            fut.add_done_callback(lambda f, k=full_key: self._done(k, f))
+        else:
+            st["coalesced"] += 1
+        return await asyncio.shield(fut)
+
+    def _done(self, full_key: Tuple[str, Hashable], fut: asyncio.Future) -> None:
+        if self._inflight.get(full_key) is fut:
+            self._inflight.pop(full_key, None)
+        if fut.cancelled():
+            return
+        if fut.exception() is not None:
+            self._kind_stats(full_key[0])["errors"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        kinds = {k: dict(v) for k, v in self._stats.items()}
+        calls = sum(v["calls"] for v in kinds.values())
+        coalesced = sum(v["coalesced"] for v in kinds.values())
+        return {
+            "in_flight": len(self._inflight),
+            "calls": calls,
+            "coalesced": coalesced,
+            "coalesced_ratio": round(coalesced / calls, 4) if calls else 0.0,
+            "kinds": kinds,
+        }
+
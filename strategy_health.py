@@ -0,0 +1,170 @@
+"""
+Saúde das estratégias de scraping (direct_api, scraperapi, playwright)
+
+Circuit breaker por (estratégia, localização): conta sucessos/falhas (falha =
+exceção ou 0 carros; uma NoResults, a fonte a dizer que não há carros para a
+pesquisa, conta como sucesso) e latência numa janela recente. Depois de N falhas
+seguidas, ou de uma taxa de falhas alta na janela, o circuito abre e a
+estratégia é saltada; quando o cooldown expira deixa passar uma única pesquisa
+de teste (half-open). Se essa correr bem, fecha; se falhar, volta a abrir com
+o cooldown a dobrar (até um máximo).
+"""
+
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class StrategySkipped(Exception):
+    """Circuito aberto: a estratégia não foi tentada"""
+
+
+class NoResults(list):
+    """Lista vazia legítima: a fonte respondeu e não há carros (não é uma falha da estratégia)"""
+
+
+class Breaker:
+    def __init__(self, failure_threshold: int = 3, failure_rate: float = 0.8, min_samples: int = 5,
+                 cooldown: float = 120.0, max_cooldown: float = 1800.0, window: int = 20):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.failure_rate = float(failure_rate)
+        self.min_samples = max(1, int(min_samples))
+        self.base_cooldown = float(cooldown)
+        self.max_cooldown = float(max_cooldown)
+        self.cooldown = self.base_cooldown
+        self.samples: Deque[Tuple[float, bool, int]] = deque(maxlen=window)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.probe_in_flight = False
+        self.opened_count = 0
+        self.skipped = 0
+        self.last_error = ""
+        self.last_ok_at: Optional[float] = None
+        self.last_fail_at: Optional[float] = None
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.time() >= self.open_until:
+            self.state = HALF_OPEN
+            self.probe_in_flight = False
+        if self.state == HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        self.skipped += 1
+        return False
+
+    def record(self, ok: bool, ms: int, error: str = "") -> None:
+        now = time.time()
+        self.samples.append((now, ok, ms))
+        if ok:
+            self.consecutive_failures = 0
+            self.last_ok_at = now
+            if self.state != CLOSED:
+                self.state = CLOSED
+                self.cooldown = self.base_cooldown
+            self.probe_in_flight = False
+            return
+        self.consecutive_failures += 1
+        self.last_fail_at = now
+        self.last_error = error or "0 items"
+        if self.state == HALF_OPEN:
+            # Teste falhou: reabrir com cooldown maior
+            self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+            self._open(now)
+            return
+        fails = sum(1 for _, s_ok, _ in self.samples if not s_ok)
+        rate_trip = len(self.samples) >= self.min_samples and fails / len(self.samples) >= self.failure_rate
+        if self.state == CLOSED and (self.consecutive_failures >= self.failure_threshold or rate_trip):
+            self._open(now)
+
+    def _open(self, now: float) -> None:
+        self.state = OPEN
+        self.open_until = now + self.cooldown
+        self.probe_in_flight = False
+        self.opened_count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        n = len(self.samples)
+        oks = sum(1 for _, ok, _ in self.samples if ok)
+        lat = sorted(ms for _, _, ms in self.samples)
+        success_rate = oks / n if n else None
+        avg_ms = int(sum(lat) / n) if n else None
+        # Score 0..1: taxa de sucesso penalizada pela latência (30s+ conta como lento)
+        score = None
+        if n:
+            score = round(success_rate * (1 - 0.3 * min(1.0, (avg_ms or 0) / 30000.0)), 3)
+        return {
+            "state": self.state,
+            "score": score,
+            "samples": n,
+            "success_rate": round(success_rate, 3) if success_rate is not None else None,
+            "avg_ms": avg_ms,
+            "p95_ms": lat[min(n - 1, int(0.95 * n))] if n else None,
+            "consecutive_failures": self.consecutive_failures,
+            "next_probe_in_s": round(max(0.0, self.open_until - time.time()), 1) if self.state == OPEN else 0,
+            "cooldown_s": self.cooldown,
+            "opened_count": self.opened_count,
+            "skipped": self.skipped,
+            "last_error": self.last_error,
+            "last_ok_at": self.last_ok_at,
+            "last_fail_at": self.last_fail_at,
+        }
+
+
+class StrategyHealth:
+    def __init__(self, **breaker_kwargs: Any):
+        self._kwargs = breaker_kwargs
+        self._breakers: Dict[Tuple[str, str], Breaker] = {}
+
+    def breaker(self, strategy: str, location: str) -> Breaker:
+        key = (strategy, (location or "").upper())
+        b = self._breakers.get(key)
+        if b is None:
+            b = self._breakers[key] = Breaker(**self._kwargs)
+        return b
+
+    def allow(self, strategy: str, location: str) -> bool:
+        return self.breaker(strategy, location).allow()
+
+    def is_open(self, strategy: str, location: str) -> bool:
+        b = self._breakers.get((strategy, (location or "").upper()))
+        return bool(b and b.state == OPEN and time.time() < b.open_until)
+
+    async def run(self, strategy: str, location: str, fn: Callable[[], Awaitable[List[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+        """Corre fn() se o circuito deixar; regista resultado e latência"""
+        b = self.breaker(strategy, location)
+        if not b.allow():
+            raise StrategySkipped(f"{strategy} circuit open for {location} (next probe in {b.snapshot()['next_probe_in_s']}s)")
+        t0 = time.time()
+        try:
+            items = await fn()
+        except Exception as e:
+            b.record(False, int((time.time() - t0) * 1000), f"{type(e).__name__}: {e}")
+            raise
+        except BaseException:
+            # Cancelado: não conta como falha, mas liberta o teste half-open
+            b.probe_in_flight = False
+            raise
+        b.record(bool(items) or isinstance(items, NoResults), int((time.time() - t0) * 1000))
+        return items
+
+    def reset(self, strategy: Optional[str] = None, location: Optional[str] = None) -> int:
+        keys = [
+            k for k in self._breakers
+            if (strategy is None or k[0] == strategy) and (location is None or k[1] == location.upper())
+        ]
+        for k in keys:
+            self._breakers.pop(k, None)
+        return len(keys)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        out: Dict[str, Dict[str, Any]] = {}
+        for (strategy, location), b in sorted(self._breakers.items()):
+            out.setdefault(strategy, {})[location] = b.snapshot()
+        return out
@@ -0,0 +1,251 @@
+"""
+Registo único de suppliers (códigos CarJet, nomes e chaves de análise)
+
+Substitui os mapas que estavam espalhados: os códigos dos logos/JSON do CarJet
+(parse_prices), o SUPPLIER_MAP do carjet_direct e a cadeia de if/elif da
+análise. As entradas vivem na BD (tabela supplier_registry, semeada com os
+valores abaixo) e são carregadas para índices em memória: códigos resolvem
+com um lookup em dict, nomes livres são memoizados.
+
+Âmbitos (scope):
+  carjet    código do logo/JSON (logo_XXX, "id" do dataMap) -> nome
+  direct    código ou nome usado pelo scraper direto (carjet_direct) -> nome
+  analysis  palavra-chave (por ordem de prioridade) -> chave de agrupamento
+"""
+
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+SCOPE_CARJET = "carjet"
+SCOPE_DIRECT = "direct"
+SCOPE_ANALYSIS = "analysis"
+SCOPES = (SCOPE_CARJET, SCOPE_DIRECT, SCOPE_ANALYSIS)
+
+# Provider logo code (logo_XXX.png) / embedded JSON id -> supplier name
+CARJET_CODES = {
+    "AUP": "Auto Prudente Rent a Car",
+    "SXT": "Sixt",
+    "ECR": "Europcar",
+    "KED": "Keddy by Europcar",
+    "EPI": "EPI",
+    "ALM": "Alamo",
+    "AVX": "Avis",
+    "BGX": "Budget",
+    "ENT": "Enterprise",
+    "DTG": "Dollar",
+    "DTG1": "Rentacar",
+    "DGT1": "Rentacar",
+    "FLZ": "Flizzr",
+    "EU2": "Goldcar Non-Refundable",
+    "EUR": "Goldcar",
+    "EUK": "Goldcar Key'n Go",
+    "GMO": "Green Motion",
+    "GMO1": "Green Motion",
+    "SAD": "Drivalia",
+    "DOH": "Drive on Holidays",
+    "D4F": "Drive4Fun",
+    "DVM": "Drive4Move",
+    "CAE": "Cael",
+    "CEN": "Centauro",
+    "ABB": "Abbycar",
+    "ABB1": "Abbycar Non-Refundable",
+    "BSD": "Best Deal",
+    "ATR": "Autorent",
+    "AUU": "Auto Union",
+    "THR": "Thrifty",
+    "HER": "Hertz",
+    "LOC": "Million",
+}
+
+# Mapa de códigos para nomes de suppliers (scraper direto)
+DIRECT_CODES = {
+    'AUP': 'Auto Prudente Rent a Car',
+    'AUTOPRUDENTE': 'Auto Prudente Rent a Car',
+    'THR': 'Thrifty',
+    'ECR': 'Europcar',
+    'ACE': 'Europcar',  # Ace é o mesmo que Europcar
+    'HER': 'Hertz',
+    'CEN': 'Centauro',
+    'OKR': 'OK Mobility',
+    'SUR': 'Surprice',
+    'GREENMOTION': 'Greenmotion',
+    'GOLDCAR': 'Goldcar',
+    'SIXT': 'Sixt',
+    'SIX': 'Sixt',
+    'ICT': 'Interrent',
+    'BGX': 'Budget',
+    'YNO': 'YesNo',
+    'KED': 'Keddy',
+    'FIR': 'Firefly',
+    'ALM': 'Alamo',
+    'NAT': 'National',
+    'ENT': 'Enterprise',
+    'ABB1': 'Abby Car',
+    'ABB': 'Abby Car',
+    'GDS': 'Goldcar',
+    'REC': 'Record Go',
+    'FLZ': 'Flizzr',
+    'ROD': 'Rhodium',
+    'CAL': 'Caleche',
+    'JUS': 'Justrent',
+    # Suppliers adicionais do CarJet
+    'AVS': 'Avis',
+    'AVI': 'Avis',
+    'DOL': 'Dollar',
+    'ALA': 'Alamo',
+    'LOC': 'Localiza',
+    'MOV': 'Movida',
+    'UNI': 'Unidas',
+    'CAR': 'Carnect',
+    'DRI': 'Drive on Holidays',
+    'KEY': 'KeynGo',
+    'LOY': 'Loyalty',
+    'RHO': 'Rhodium',
+    'WAY': 'Wayzor',
+    'TEL': 'Tellescar',
+    'OTO': 'Otopeni',
+    'MAS': 'Master',
+    'VIC': 'Victoria Cars',
+    'AER': 'Aercar',
+    'FLE': 'Fleet',
+    'TOP': 'TopCar',
+    'LIS': 'Lisbon Cars',
+    'GUA': 'Guerin',
+    'ADA': 'Ada',
+    'IDE': 'Ideamerge',
+}
+
+# Standardize common variations for better grouping (primeira palavra-chave contida ganha)
+ANALYSIS_KEYWORDS = [
+    ("autoprudente", "autoprudente"),
+    ("auto prudente", "autoprudente"),
+    ("hertz", "hertz"),
+    ("europcar", "europcar"),
+    ("keddy", "keddy"),
+    ("thrifty", "thrifty"),
+    ("goldcar", "goldcar"),
+    ("ok mobility", "ok_mobility"),
+    ("centauro", "centauro"),
+    ("surprice", "surprice"),
+    ("firefly", "firefly"),
+    ("sixt", "sixt"),
+    ("avis", "avis"),
+    ("budget", "budget"),
+    ("enterprise", "enterprise"),
+    ("national", "national"),
+    ("dollar", "dollar"),
+    ("alamo", "alamo"),
+]
+
+LOGO_CODE_RX = re.compile(r'logo[_-]([A-Z0-9]+)')
+MEMO_MAX = 4096
+
+Row = Tuple[str, str, str]  # (scope, code, name)
+
+
+def default_rows() -> List[Row]:
+    rows: List[Row] = [(SCOPE_CARJET, c, n) for c, n in CARJET_CODES.items()]
+    rows += [(SCOPE_DIRECT, c, n) for c, n in DIRECT_CODES.items()]
+    rows += [(SCOPE_ANALYSIS, k, v) for k, v in ANALYSIS_KEYWORDS]
+    return rows
+
+
+class SupplierRegistry:
+    def __init__(self, rows: Optional[Iterable[Row]] = None, memo_max: int = MEMO_MAX):
+        self._codes: Dict[str, Dict[str, str]] = {s: {} for s in SCOPES}
+        for scope, code, name in (default_rows() if rows is None else rows):
+            if code and name:
+                self._codes.setdefault(scope, {})[code] = name
+        direct = self._codes[SCOPE_DIRECT]
+        # Scan de nomes livres: mesma ordem e testes do antigo normalize_supplier
+        self._direct_scan = [(code, name, name.upper()) for code, name in direct.items()]
+        self._analysis_scan = list(self._codes[SCOPE_ANALYSIS].items())
+        self._memo_max = max(1, int(memo_max))
+        self._memo: Dict[Tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def codes(self, scope: str = SCOPE_CARJET) -> Dict[str, str]:
+        return dict(self._codes.get(scope, {}))
+
+    def resolve_code(self, code: str, scope: str = SCOPE_CARJET) -> str:
+        """Código -> nome; códigos desconhecidos passam tal como vieram"""
+        return self._codes.get(scope, {}).get(code, code)
+
+    def _memoized(self, kind: str, name: str, fn) -> str:
+        key = (kind, name)
+        v = self._memo.get(key)
+        if v is not None:
+            self.hits += 1
+            return v
+        self.misses += 1
+        v = fn(name)
+        with self._lock:
+            if len(self._memo) >= self._memo_max:
+                self._memo.clear()
+            self._memo[key] = v
+        return v
+
+    def normalize(self, name: str) -> str:
+        """Código, ficheiro de logo ou nome livre -> nome completo (scraper direto)"""
+        if not name:
+            return 'CarJet'
+        return self._memoized(SCOPE_DIRECT, name, self._normalize)
+
+    def _normalize(self, name: str) -> str:
+        direct = self._codes[SCOPE_DIRECT]
+        name_upper = name.upper().strip()
+        # Tentar extrair código de logo primeiro (ex: logo_AUP.png → AUP)
+        logo_match = LOGO_CODE_RX.search(name_upper)
+        if logo_match and logo_match.group(1) in direct:
+            return direct[logo_match.group(1)]
+        if name_upper in direct:
+            return direct[name_upper]
+        for code, full_name, full_upper in self._direct_scan:
+            if code in name_upper or full_upper in name_upper:
+                return full_name
+        if logo_match:
+            return logo_match.group(1).title()
+        return name.strip()
+
+    def analysis_key(self, name: Any) -> str:
+        """Nome do supplier -> chave de agrupamento da análise (keep ALL suppliers, just standardize format)"""
+        return self._memoized(SCOPE_ANALYSIS, str(name), self._analysis_key)
+
+    def _analysis_key(self, name: str) -> str:
+        name = name.strip().lower()
+        for keyword, key in self._analysis_scan:
+            if keyword in name:
+                return key
+        return name.replace(' ', '_')
+
+    def rows(self) -> List[Row]:
+        return [(scope, code, name) for scope, codes in self._codes.items() for code, name in codes.items()]
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": {scope: len(codes) for scope, codes in self._codes.items()},
+            "memo_size": len(self._memo),
+            "memo_hits": self.hits,
+            "memo_misses": self.misses,
+            "memo_hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+_REGISTRY: Optional[SupplierRegistry] = None
+
+
+def get_registry() -> SupplierRegistry:
+    """Registo ativo (valores por omissão até a app carregar a BD)"""
+    global _REGISTRY
+    if _REGISTRY is None:
+        _REGISTRY = SupplierRegistry()
+    return _REGISTRY
+
+
+def set_registry(registry: SupplierRegistry) -> None:
+    global _REGISTRY
+    _REGISTRY = registry
@@ -0,0 +1,143 @@
+"""
+Blocklist de modelos de veículos (parse_prices e normalize_and_sort)
+
+Um único matcher partilhado: os nomes exatos vão para um set e os padrões
+regex, junto com os nomes longos (que também bloqueiam quando aparecem dentro
+do nome), são compilados uma só vez numa alternação. A lista por omissão é a
+que estava repetida no código; pode ser substituída a partir da BD
+(app_settings) e o matcher é recompilado quando muda.
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_MODELS = [
+    "Mercedes S Class Auto",
+    "MG ZS Auto",
+    "Mercedes CLA Coupe Auto",
+    "Mercedes A Class",
+    "Mercedes A Class Auto",
+    "BMW 1 Series Auto",
+    "BMW 3 Series SW Auto",
+    "Volvo V60 Auto",
+    "Volvo XC40 Auto",
+    "Mercedes C Class Auto",
+    "Tesla Model 3 Auto",
+    "Electric",
+    "BMW 2 Series Gran Coupe Auto",
+    "Mercedes C Class SW Auto",
+    "Mercedes E Class Auto",
+    "Mercedes E Class SW Auto",
+    "BMW 5 Series SW Auto",
+    "BMW X1 Auto",
+    "Mercedes CLE Coupe Auto",
+    "Volkswagen T-Roc Cabrio",
+    "Mercedes GLA Auto",
+    "Volvo XC60 Auto",
+    "Volvo EX30 Auto",
+    "BMW 3 Series Auto",
+    "Volvo V60 4x4 Auto",
+    "Hybrid",
+    "Mazda MX5 Cabrio Auto",
+    "Mercedes CLA Auto",
+]
+
+# Famílias de modelos e motorizações (aplicados ao nome normalizado, em minúsculas)
+DEFAULT_PATTERNS = [
+    r"\bmercedes\s+s\s*class\b",
+    r"\bmercedes\s+cla\b",
+    r"\bmercedes\s+cle\b",
+    r"\bmercedes\s+a\s*class\b",
+    r"\bmercedes\s+c\s*class\b",
+    r"\bmercedes\s+e\s*class\b",
+    r"\bmercedes\s+gla\b",
+    r"\bbmw\s+1\s*series\b",
+    r"\bbmw\s+2\s*series\b",
+    r"\bbmw\s+3\s*series\b",
+    r"\bbmw\s+5\s*series\b",
+    r"\bbmw\s*x1\b",
+    r"\bvolvo\s+v60\b",
+    r"\bvolvo\s+xc40\b",
+    r"\bvolvo\s+xc60\b",
+    r"\bvolvo\s+ex30\b",
+    r"\btesla\s+model\s*3\b",
+    r"\bmg\s+zs\b",
+    r"\bmazda\s+mx5\b",
+    r"\bvolkswagen\s+t-roc\b",
+    r"\belectric\b",
+    r"\bhybrid\b",
+]
+
+# Nomes com pelo menos isto de comprimento também bloqueiam como substring
+MIN_CONTAINED_LEN = 6
+
+
+def norm_text(s: str) -> str:
+    s = (s or "").strip().lower()
+    # remove duplicate spaces and commas spacing
+    return " ".join(s.replace(",", " ").split())
+
+
+def validate_patterns(patterns: Iterable[str]) -> List[Tuple[str, str]]:
+    """[(padrão, erro)] dos padrões que não compilam"""
+    bad: List[Tuple[str, str]] = []
+    for p in patterns:
+        try:
+            re.compile(p)
+        except re.error as e:
+            bad.append((p, str(e)))
+    return bad
+
+
+class BlocklistMatcher:
+    def __init__(self, models: Optional[Iterable[str]] = None, patterns: Optional[Iterable[str]] = None,
+                 enabled: bool = True):
+        self.models = [m for m in (DEFAULT_MODELS if models is None else models) if norm_text(m)]
+        self.patterns = [p for p in (DEFAULT_PATTERNS if patterns is None else patterns) if p]
+        self.enabled = enabled
+        self.invalid = validate_patterns(self.patterns)
+        bad = {p for p, _ in self.invalid}
+        self._exact = frozenset(norm_text(m) for m in self.models)
+        alternatives = [f"(?:{p})" for p in self.patterns if p not in bad]
+        alternatives += [re.escape(m) for m in sorted(self._exact) if len(m) >= MIN_CONTAINED_LEN]
+        self._rx = re.compile("|".join(alternatives)) if alternatives else None
+        self.checked = 0
+        self.blocked = 0
+
+    def is_blocked(self, name: str) -> bool:
+        n = norm_text(name)
+        if not n:
+            return False
+        self.checked += 1
+        if n in self._exact or (self._rx is not None and self._rx.search(n) is not None):
+            self.blocked += 1
+            return True
+        return False
+
+    def match(self, name: str) -> str:
+        """Que entrada bloqueia este nome ('' se nenhuma) - para o admin, não para o caminho quente"""
+        n = norm_text(name)
+        if not n:
+            return ""
+        if n in self._exact:
+            return n
+        for p in self.patterns:
+            try:
+                if re.search(p, n):
+                    return p
+            except re.error:
+                continue
+        for m in self._exact:
+            if len(m) >= MIN_CONTAINED_LEN and m in n:
+                return m
+        return ""
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "models": self.models,
+            "patterns": self.patterns,
+            "invalid_patterns": [{"pattern": p, "error": e} for p, e in self.invalid],
+            "checked": self.checked,
+            "blocked": self.blocked,
+        }